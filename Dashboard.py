@@ -1,3 +1,59 @@
-import streamlit as st
-
-st.title("Dashboard")
\ No newline at end of file
+import streamlit as st
+from datetime import date, timedelta
+from summaries import LABOUR_TYPES, get_revenue, get_item_types, get_top_articles
+
+st.title("Dashboard")
+
+# Period (the figures come from the pre-aggregated summary tables, so a long
+# period costs no more than a short one)
+col1, col2 = st.columns(2)
+with col1:
+    date_from = st.date_input("From Date", value=date.today() - timedelta(days=365), key="dashboard_from")
+with col2:
+    date_to = st.date_input("To Date", key="dashboard_to")
+
+revenue = get_revenue(date_from.strftime('%Y-%m-%d'), date_to.strftime('%Y-%m-%d'))
+item_types = get_item_types(date_from.strftime('%Y-%m-%d'), date_to.strftime('%Y-%m-%d'))
+
+if revenue.empty:
+    st.info("No jobs in this period.")
+    st.stop()
+
+# Key figures
+by_status = revenue.groupby('status')['total'].sum()
+labour = item_types.loc[item_types['type'].isin(LABOUR_TYPES), 'amount'].sum()
+material = item_types.loc[~item_types['type'].isin(LABOUR_TYPES), 'amount'].sum()
+
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Revenue", f"CHF {revenue['total'].sum():,.2f}")
+col2.metric("Jobs", f"{revenue['jobs'].sum():,}")
+col3.metric("Open", f"CHF {by_status.get('open', 0):,.2f}")
+col4.metric("Invoiced / Paid", f"CHF {by_status.get('invoiced', 0) + by_status.get('paid', 0):,.2f}")
+
+# Revenue over time
+tab_day, tab_month = st.tabs(["Per day", "Per month"])
+with tab_day:
+    st.bar_chart(revenue.groupby('day')['total'].sum())
+with tab_month:
+    st.bar_chart(revenue.groupby(revenue['day'].str[:7])['total'].sum())
+
+col1, col2 = st.columns(2)
+with col1:
+    st.subheader("Material vs. Labour")
+    st.bar_chart(item_types.groupby('type')['amount'].sum())
+    st.caption(f"Material CHF {material:,.2f} · Labour CHF {labour:,.2f}")
+with col2:
+    st.subheader("Open vs. Invoiced")
+    st.dataframe(by_status.rename('total').reset_index(), hide_index=True, use_container_width=True)
+
+# Clients and articles
+col1, col2 = st.columns(2)
+with col1:
+    st.subheader("Revenue per Client")
+    clients = (revenue.groupby('client_name')[['jobs', 'total']].sum()
+               .sort_values('total', ascending=False).reset_index())
+    st.dataframe(clients, hide_index=True, use_container_width=True)
+with col2:
+    st.subheader("Top Catalog Articles")
+    st.caption("All time")
+    st.dataframe(get_top_articles(), hide_index=True, use_container_width=True)
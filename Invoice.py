@@ -1,182 +1,82 @@
-import streamlit as st
-import sqlite3
-from datetime import datetime
-import pandas as pd
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-import io
-
-def get_jobs(date_from=None, date_to=None, search_term=None):
-   conn = sqlite3.connect('job_data.db')
-   query = """
-       SELECT j.*, 
-              GROUP_CONCAT(i.description || ' - ' || i.quantity || ' x CHF' || i.price) as items
-       FROM jobs j
-       LEFT JOIN job_items i ON j.job_id = i.job_id
-       WHERE 1=1
-   """
-   params = []
-   if date_from:
-       query += " AND j.job_date >= ?"
-       params.append(date_from)
-   if date_to:
-       query += " AND j.job_date <= ?"
-       params.append(date_to)
-   if search_term:
-       query += " AND (j.client_name LIKE ? OR j.job_id LIKE ?)"
-       params.extend([f"%{search_term}%", f"%{search_term}%"])
-   query += " GROUP BY j.job_id ORDER BY j.job_date DESC"
-   return pd.read_sql_query(query, conn, params=params)
-
-def delete_job(job_id):
-   conn = sqlite3.connect('job_data.db')
-   c = conn.cursor()
-   try:
-       c.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
-       c.execute("DELETE FROM job_items WHERE job_id = ?", (job_id,))
-       conn.commit()
-       return True
-   except Exception as e:
-       st.error(f"Error deleting job: {str(e)}")
-       return False
-   finally:
-       conn.close()
-
-def get_job_details(job_id):
-   conn = sqlite3.connect('job_data.db')
-   c = conn.cursor()
-   c.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
-   job = c.fetchone()
-   c.execute("SELECT * FROM job_items WHERE job_id = ?", (job_id,))
-   items = c.fetchall()
-   conn.close()
-   return job, items
-
-def create_pdf_invoice(selected_jobs):
-   buffer = io.BytesIO()
-   doc = SimpleDocTemplate(buffer, pagesize=A4)
-   elements = []
-   styles = getSampleStyleSheet()
-
-   for _, job in selected_jobs.iterrows():
-       # Header
-       elements.append(Paragraph("DÜBENDORFER SANITÄR-SERVICE GmbH", styles['Heading1']))
-       elements.append(Paragraph("Glattwiesenstrasse 20, 8152 Glattbrugg", styles['Normal']))
-       elements.append(Paragraph("Tel: 076 388 95 60", styles['Normal']))
-       elements.append(Spacer(1, 20))
-       
-       # Client Info
-       elements.append(Paragraph(f"Bill To:", styles['Normal']))
-       elements.append(Paragraph(job['client_name'], styles['Normal']))
-       elements.append(Paragraph(job['client_address'], styles['Normal']))
-       elements.append(Spacer(1, 20))
-       
-       # Invoice Details
-       elements.append(Paragraph(f"Invoice #: {job['job_id']}", styles['Normal']))
-       elements.append(Paragraph(f"Date: {job['job_date']}", styles['Normal']))
-       elements.append(Spacer(1, 20))
-
-       # Get items
-       conn = sqlite3.connect('job_data.db')
-       c = conn.cursor()
-       c.execute("SELECT * FROM job_items WHERE job_id = ?", (job['job_id'],))
-       items = c.fetchall()
-
-       # Items Table
-       data = [['Description', 'Quantity', 'Price', 'Total']]
-       for item in items:
-           total = float(item[4]) * float(item[5])
-           data.append([
-               item[3],
-               f"{float(item[5]):.2f}",
-               f"CHF {float(item[4]):.2f}",
-               f"CHF {total:.2f}"
-           ])
-       data.append(['', '', 'Total:', f"CHF {float(job['total_amount']):.2f}"])
-
-       table = Table(data, colWidths=[250, 75, 100, 100])
-       table.setStyle([
-           ('FONT', (0,0), (-1,-1), 'Helvetica'),
-           ('FONTSIZE', (0,0), (-1,-1), 10),
-           ('GRID', (0,0), (-1,-2), 1, colors.black),
-           ('BACKGROUND', (0,0), (-1,0), colors.grey),
-           ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-       ])
-       
-       elements.append(table)
-       elements.append(Spacer(1, 20))
-       
-       # Bank Details
-       elements.append(Paragraph("Bank Details:", styles['Normal']))
-       elements.append(Paragraph("Bank: UBS Switzerland AG", styles['Normal']))
-       elements.append(Paragraph("IBAN: CH85 0028 3283 1127 5501 Y", styles['Normal']))
-       elements.append(Paragraph("BIC: UBSWCHZH80A", styles['Normal']))
-       elements.append(Paragraph("MWST-Nr.: CHE-257.523.928", styles['Normal']))
-       
-       elements.append(Spacer(1, 30))
-
-   doc.build(elements)
-   return buffer.getvalue()
-
-st.title("Invoice Creator")
-
-# Filters
-col1, col2, col3 = st.columns(3)
-with col1:
-   date_from = st.date_input("From Date", key="date_from")
-with col2:
-   date_to = st.date_input("To Date", key="date_to")
-with col3:
-   search = st.text_input("Search (Client or Job ID)", key="search")
-
-# Get filtered jobs
-jobs = get_jobs(
-   date_from.strftime('%Y-%m-%d'),
-   date_to.strftime('%Y-%m-%d'),
-   search
-)
-
-# Multi-select jobs
-selected_job_indices = []
-for index, job in jobs.iterrows():
-   with st.container(border=True):
-       col1, col2, col3 = st.columns([2,2,1])
-       
-       with col1:
-           selected = st.checkbox(f"Select", key=f"select_{job['job_id']}")
-           if selected:
-               selected_job_indices.append(index)
-           st.markdown(f"**Job ID:** {job['job_id']}")
-           st.markdown(f"**Client:** {job['client_name']}")
-       
-       with col2:
-           st.markdown(f"**Date:** {job['job_date']}")
-           st.markdown(f"**Total:** CHF {job['total_amount']:.2f}")
-       
-       with col3:
-           if st.button("Delete", key=job['job_id']):
-               if delete_job(job['job_id']):
-                   st.success("Job deleted!")
-                   st.rerun()
-       
-       with st.expander("Details"):
-           st.write("**Address:**", job['client_address'])
-           st.write("**Notes:**", job['job_notes'])
-           if job['items']:
-               st.write("**Items:**")
-               items_list = job['items'].split(',')
-               for item in items_list:
-                   st.write(f"- {item}")
-
-# Generate PDF button
-if selected_job_indices and st.button("Generate Selected Invoices"):
-   selected_jobs = jobs.iloc[selected_job_indices]
-   pdf = create_pdf_invoice(selected_jobs)
-   st.download_button(
-       label="Download Invoices",
-       data=pdf,
-       file_name="invoices.pdf",
-       mime="application/pdf"
-   )
\ No newline at end of file
+import streamlit as st
+import time
+from invoice_queue import get_queue
+from job_views import job_filters, job_page, job_table, job_cards, bulk_actions, undo_banner
+from statements import statements_zip
+from summaries import get_revenue
+
+queue = get_queue()
+
+st.title("Invoice Creator")
+undo_banner()
+
+# Filters
+filters = job_filters()
+
+# Get the current page of filtered jobs
+jobs, compact = job_page("invoice", filters)
+
+# Multi-select jobs
+if compact:
+   selected_job_indices = job_table(jobs, "invoice")
+else:
+   selected_job_indices = job_cards(jobs, "invoice", selectable=True)
+bulk_actions(jobs.iloc[selected_job_indices], "invoice")
+
+# Generate PDF button (the invoices are rendered in the background)
+output = st.radio("Output", ["One PDF", "ZIP with one PDF per invoice"], horizontal=True)
+if selected_job_indices and st.button("Generate Selected Invoices"):
+   selected_jobs = jobs.iloc[selected_job_indices].to_dict('records')
+   queue.submit(selected_jobs, 'pdf' if output == "One PDF" else 'zip')
+
+# Client statements and the period report for the dates of the filters, one
+# file per client in a zip
+st.subheader("Client Statements")
+date_from, date_to, _ = filters
+col1, col2 = st.columns(2)
+with col1:
+   clients = sorted(get_revenue(date_from, date_to)['client_name'].unique())
+   statement_client = st.selectbox("Client", ["All clients"] + clients, key="statement_client")
+with col2:
+   statement_format = st.radio("Format", ["PDF", "CSV"], horizontal=True, key="statement_format")
+if st.button("Create Statements"):
+   with st.spinner("Creating statements..."):
+       st.session_state["statements"] = (
+           statements_zip(date_from, date_to, None if statement_client == "All clients" else statement_client,
+                          output=statement_format.lower()),
+           f"statements_{date_from}_{date_to}.zip",
+       )
+if "statements" in st.session_state:
+   data, file_name = st.session_state["statements"]
+   st.download_button("Download Statements", data=data, file_name=file_name, mime="application/zip")
+
+# Progress and downloads, refreshed every 2 seconds while a batch is running
+polling = queue.busy()
+
+@st.fragment(run_every=2 if polling else None)
+def invoice_batches():
+   batches = queue.recent()
+   if batches:
+       st.subheader("Invoice Batches")
+   for batch in batches:
+       with st.container(border=True):
+           created = time.strftime('%d.%m.%Y %H:%M:%S', time.localtime(batch.created))
+           if batch.status == 'done':
+               with open(batch.path, 'rb') as f:
+                   st.download_button(
+                       label=f"Download {batch.total} Invoices ({created})",
+                       data=f,
+                       file_name=batch.file_name,
+                       mime="application/zip" if batch.output == 'zip' else "application/pdf",
+                       key=f"download_{batch.id}"
+                   )
+           elif batch.status == 'failed':
+               st.error(f"Generating {batch.total} invoices ({created}) failed: {batch.error}")
+           else:
+               st.progress(batch.done / batch.total, text=f"{batch.done} of {batch.total} invoices ({created})")
+
+   # everything is finished, one full rerun turns the polling off again
+   if polling and not queue.busy():
+       st.rerun()
+
+invoice_batches()
@@ -0,0 +1,58 @@
+import hmac
+import os
+import streamlit as st
+import pandas as pd
+from instrumentation import ENABLED, METRICS, SLOW_LOG, SLOW_QUERY_MS, read_slow_log
+
+st.title("Performance")
+
+# Admins only: the page asks for PLUMBY_ADMIN_PASSWORD and stays closed if
+# none is configured
+admin_password = os.environ.get('PLUMBY_ADMIN_PASSWORD')
+if not admin_password:
+    st.info("Set PLUMBY_ADMIN_PASSWORD to open this page.")
+    st.stop()
+if not st.session_state.get('performance_admin'):
+    password = st.text_input("Admin password", type="password")
+    if not password:
+        st.stop()
+    if not hmac.compare_digest(password, admin_password):
+        st.error("Wrong password.")
+        st.stop()
+    st.session_state.performance_admin = True
+
+if not ENABLED:
+    st.info("Instrumentation is off, start the app with PLUMBY_INSTRUMENTATION=1 to collect timings.")
+    st.stop()
+
+st.caption(f"Durations in ms over the latest calls of this server process. Statements over "
+           f"{SLOW_QUERY_MS:.0f} ms are written to {SLOW_LOG}.")
+if st.button("Reset timings"):
+    METRICS.reset()
+
+# Pages, data access and invoice rendering
+st.subheader("Operations")
+operations = pd.DataFrame(METRICS.summary('op:'))
+if operations.empty:
+    st.write("Nothing measured yet.")
+else:
+    st.dataframe(operations, hide_index=True, use_container_width=True)
+
+# Single SQL statements, slowest first
+st.subheader("SQL Statements")
+statements = pd.DataFrame(METRICS.summary('sql:'))
+if statements.empty:
+    st.write("Nothing measured yet.")
+else:
+    st.dataframe(statements.sort_values('p95_ms', ascending=False), hide_index=True, use_container_width=True)
+
+# Slow log with the query plans
+st.subheader("Slow Queries")
+slow = read_slow_log()
+if not slow:
+    st.write("No slow queries logged.")
+for entry in slow:
+    with st.expander(f"{entry['ms']:.0f} ms · {entry['operation'] or '-'} · {entry['time']}"):
+        st.code(entry['sql'], language='sql')
+        st.write("**Parameters:**", entry['params'])
+        st.code("\n".join(entry['plan']))
@@ -1,43 +1,67 @@
-import streamlit as st
-
-#----- PAGE SETUP ---------
-
-# Dashboard Page
-main_page = st.Page(
-    page="views/Dashboard.py",
-    title="Dashboard",
-    icon="",
-    default=True,
-)
-
-# Job Entry Page
-
-JobEntry_page = st.Page(
-    page="views\JobEntry.py",
-    title="Job Entry",
-    icon="",
-)  
-
-# Job List Page
-
-JobList_page = st.Page(
-    page="views\JobList.py",
-    title="Job List",
-    icon="",
-)
-
-# Invoice Creater Page
-
-Invoice_page = st.Page(
-    page="views\Invoice.py",
-    title="Invoice Creater",
-    icon="",
-)
-
-#------Naviagtion Setup -------------
-
-pg = st.navigation(pages=[main_page, JobEntry_page, JobList_page, Invoice_page])
-
-#------RUN NAVIAGTION --------------
-
-pg.run()
\ No newline at end of file
+import streamlit as st
+from backup import BACKUP_HOURS, BackupScheduler
+from instrumentation import ENABLED, measure
+
+#----- PAGE SETUP ---------
+
+# Dashboard Page
+main_page = st.Page(
+    page="views/Dashboard.py",
+    title="Dashboard",
+    icon="",
+    default=True,
+)
+
+# Job Entry Page
+
+JobEntry_page = st.Page(
+    page="views\JobEntry.py",
+    title="Job Entry",
+    icon="",
+)  
+
+# Job List Page
+
+JobList_page = st.Page(
+    page="views\JobList.py",
+    title="Job List",
+    icon="",
+)
+
+# Invoice Creater Page
+
+Invoice_page = st.Page(
+    page="views\Invoice.py",
+    title="Invoice Creater",
+    icon="",
+)
+
+# Performance Page (admins only, with instrumentation switched on)
+
+Performance_page = st.Page(
+    page="views/Performance.py",
+    title="Performance",
+    icon="",
+)
+
+#------Naviagtion Setup -------------
+
+pages = [main_page, JobEntry_page, JobList_page, Invoice_page]
+if ENABLED:
+    pages.append(Performance_page)
+pg = st.navigation(pages=pages)
+
+#------BACKUPS (every PLUMBY_BACKUP_HOURS) --
+
+@st.cache_resource
+def backup_scheduler():
+    # one scheduler per app process, started by the first page run
+    return BackupScheduler()
+
+if BACKUP_HOURS:
+    backup_scheduler()
+
+#------RUN NAVIAGTION --------------
+
+with measure(f"page:{pg.title}"):
+    pg.run()
\ No newline at end of file
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+from datetime import date, timedelta
+from job_store import (JOB_DB, archive_path, bulk_delete_jobs, deferred_search_index, deferred_summaries, job_databases,
+                       purge_deleted_jobs)
+from migrations import migrate
+
+# Moves old jobs with their items out of the job database into one archive
+# database per year (archive/job_data_2021.db, ...). An archive is a job
+# database of its own, with the same schema, search index and summaries, so
+# the pages read it like the job database once it is attached; they only
+# attach it when the dates they show reach back into its year.
+
+ARCHIVE_AGE_DAYS = 730
+
+
+def _move_year(database, path, start, end):
+    # Moves the jobs of [start, end) that aren't deleted from the job database
+    # into the archive at path, in one transaction over both: the archive is
+    # the connection's main database, the job database is attached as hot and
+    # BEGIN IMMEDIATE takes the write lock of each. A job still in the job
+    # database is live there, so a copy of it already in the archive (left by
+    # a run that was interrupted between the two commits, SQLite commits
+    # each WAL database on its own) is replaced by the current row.
+    # Returns the number of jobs moved.
+    archive = sqlite3.connect(path, timeout=30)
+    try:
+        archive.execute("PRAGMA journal_mode=WAL")
+        migrate(archive)
+        archive.execute("ATTACH DATABASE ? AS hot", (database,))
+        archive.execute("BEGIN IMMEDIATE")
+        try:
+            if archive.execute("SELECT 1 FROM main.jobs WHERE job_id IN (SELECT job_id FROM hot.jobs) LIMIT 1").fetchone():
+                bulk_delete_jobs(archive, "job_id IN (SELECT job_id FROM hot.jobs)")
+            last_id = archive.execute("SELECT COALESCE(MAX(id), 0) FROM main.jobs").fetchone()[0]
+            with deferred_search_index(archive), deferred_summaries(archive):
+                archive.execute("""INSERT INTO main.jobs (job_id, client_name, client_address, job_date, job_notes,
+                                                          total_amount, timestamp, status)
+                                   SELECT job_id, client_name, client_address, job_date, job_notes,
+                                          total_amount, timestamp, status
+                                   FROM hot.jobs WHERE job_date >= ? AND job_date < ? AND deleted_at IS NULL
+                                   ORDER BY job_date, job_id""", (start, end))
+                archive.execute("""INSERT INTO main.job_items (job_id, type, description, price, quantity, article_nr)
+                                   SELECT i.job_id, i.type, i.description, i.price, i.quantity, i.article_nr
+                                   FROM main.jobs j JOIN hot.job_items i ON i.job_id = j.job_id
+                                   WHERE j.id > ? ORDER BY i.id""", (last_id,))
+            moved = bulk_delete_jobs(archive, "job_date >= ? AND job_date < ? AND deleted_at IS NULL", (start, end),
+                                     schema='hot')
+            archive.commit()
+        except BaseException:
+            archive.rollback()
+            raise
+        return moved
+    finally:
+        archive.close()
+
+
+def archive_jobs(database=JOB_DB, older_than_days=ARCHIVE_AGE_DAYS):
+    # Archives the jobs dated more than older_than_days ago, year by year.
+    # The job database's write lock is held while a year is moved, saves in
+    # the app wait on the busy timeout meanwhile. Jobs marked as deleted stay
+    # behind until they are purged, so they can still be restored. Returns
+    # {year: number of jobs moved}.
+    cutoff = (date.today() - timedelta(days=older_than_days)).isoformat()
+    conn = sqlite3.connect(database, timeout=30)
+    try:
+        migrate(conn)
+        years = [row[0] for row in conn.execute("""SELECT DISTINCT substr(job_date, 1, 4) FROM jobs
+                                                   WHERE job_date < ? AND job_date GLOB '[0-9][0-9][0-9][0-9]-*'
+                                                   ORDER BY 1""", (cutoff,))]
+    finally:
+        conn.close()
+
+    moved = {}
+    for year in years:
+        start, end = f"{year}-01-01", min(f"{int(year) + 1}-01-01", cutoff)
+        path = archive_path(year, database)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        moved[int(year)] = _move_year(database, path, start, end)
+    return moved
+
+
+def maintain(database=JOB_DB, archives=False):
+    # Jobs deleted longer than UNDO_SECONDS ago are purged first. Merging the
+    # search index drops the entries of deleted (archived) jobs,
+    # which FTS5 otherwise keeps until segments happen to be merged. VACUUM
+    # then gives their space back and defragments the tables, ANALYZE
+    # refreshes the planner statistics. Returns {path: (bytes before, after)}.
+    sizes = {}
+    for path in job_databases(database) if archives else [database]:
+        before = os.path.getsize(path)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        try:
+            migrate(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            purge_deleted_jobs(conn)
+            conn.execute("COMMIT")
+            conn.execute("INSERT INTO jobs_fts (jobs_fts) VALUES ('optimize')")
+            conn.execute("VACUUM")
+            conn.execute("ANALYZE")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            conn.close()
+        sizes[path] = (before, os.path.getsize(path))
+    return sizes
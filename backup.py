@@ -0,0 +1,204 @@
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from instrumentation import LOGGER
+from job_store import JOB_DB, job_databases
+from migrations import migrate
+
+# Online backups of the job database and its archives. The pages are copied
+# with SQLite's backup API a few MB at a time while the app keeps reading
+# and saving jobs, so a snapshot is never torn and nobody has to stop the app.
+# A snapshot is a directory backups/YYYYmmdd_HHMMSS with the database files
+# and a SHA256SUMS file (`sha256sum -c SHA256SUMS` checks it by hand); the
+# newest BACKUP_KEEP are kept. The catalog isn't backed up, it's reloaded
+# from the price list.
+#
+# With PLUMBY_BACKUP_HOURS set the app takes a snapshot in a background
+# thread every that many hours.
+
+BACKUP_HOURS = float(os.environ.get('PLUMBY_BACKUP_HOURS', 0))
+BACKUP_DIR = os.environ.get('PLUMBY_BACKUP_DIR', 'backups')
+BACKUP_KEEP = int(os.environ.get('PLUMBY_BACKUP_KEEP', 14))
+STEP_PAGES = 1024               # pages copied per step, 4 MB with the default page size
+STEP_PAUSE = 0.005              # seconds between steps, room for the app's own statements
+SNAPSHOT_NAME = re.compile(r'\d{8}_\d{6}$')
+CHECKSUMS = 'SHA256SUMS'
+PARTIAL = '.partial'
+
+
+def _copy(path, target, pages=STEP_PAGES, pause=STEP_PAUSE):
+    # Copies the database at path into the file target. The source holds one
+    # read transaction for the whole copy: in WAL mode that doesn't block
+    # writers, and it keeps the backup on one snapshot, without it every
+    # commit in between makes the backup start over.
+    source = sqlite3.connect(path, timeout=30, isolation_level=None)
+    copy = sqlite3.connect(target, isolation_level=None)
+    try:
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        source.backup(copy, pages=pages, progress=lambda status, remaining, total: time.sleep(pause))
+        source.execute("ROLLBACK")
+        # a self-contained file, no -wal next to it
+        copy.execute("PRAGMA journal_mode=DELETE")
+        result = copy.execute("PRAGMA quick_check").fetchone()[0]
+        if result != 'ok':
+            raise sqlite3.DatabaseError(f"{os.path.basename(path)}: backup copy failed the check: {result}")
+    finally:
+        copy.close()
+        source.close()
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _files(database):
+    # (path of the live database, its path inside a snapshot), the job
+    # database first: a job archived while the backup runs is then in at
+    # least one of the copies
+    return [(path, os.path.relpath(path, os.path.dirname(database) or '.')) for path in job_databases(database)]
+
+
+def snapshots(directory=BACKUP_DIR):
+    # paths of the complete snapshots, oldest first
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in sorted(names) if SNAPSHOT_NAME.match(name)]
+
+
+def snapshot_time(snapshot):
+    return time.mktime(time.strptime(os.path.basename(snapshot), '%Y%m%d_%H%M%S'))
+
+
+def backup_database(database=JOB_DB, directory=BACKUP_DIR, keep=BACKUP_KEEP):
+    # Writes a snapshot of the job database and its archives and returns its
+    # path. It's built under a .partial name and renamed when complete, so
+    # an interrupted backup is never taken for a snapshot. keep=None keeps
+    # all snapshots.
+    snapshot = os.path.join(directory, time.strftime('%Y%m%d_%H%M%S'))
+    if os.path.exists(snapshot):
+        raise FileExistsError(f"{snapshot} already exists, one backup per second at most")
+    partial = snapshot + PARTIAL
+    try:
+        sums = []
+        for path, relative in _files(database):
+            target = os.path.join(partial, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _copy(path, target)
+            sums.append(f"{_sha256(target)}  {relative.replace(os.sep, '/')}\n")
+        with open(os.path.join(partial, CHECKSUMS), 'w', encoding='utf-8', newline='\n') as f:
+            f.writelines(sums)
+        os.rename(partial, snapshot)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    if keep is not None:
+        rotate(directory, keep)
+    return snapshot
+
+
+def rotate(directory=BACKUP_DIR, keep=BACKUP_KEEP):
+    # removes all but the newest `keep` snapshots, and leftovers of
+    # interrupted backups; returns the removed paths
+    removed = snapshots(directory)[:-keep] if keep > 0 else snapshots(directory)
+    removed += [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(PARTIAL)]
+    for path in removed:
+        shutil.rmtree(path, ignore_errors=True)
+    return removed
+
+
+def verify_snapshot(snapshot):
+    # Checks every file of the snapshot against SHA256SUMS and returns the
+    # relative paths; raises ValueError naming the files that don't match
+    try:
+        with open(os.path.join(snapshot, CHECKSUMS), encoding='utf-8') as f:
+            sums = [line.rstrip('\n').split('  ', 1) for line in f if line.strip()]
+    except FileNotFoundError:
+        raise ValueError(f"{snapshot} has no {CHECKSUMS}, it isn't a complete snapshot")
+    bad = [relative for digest, relative in sums
+           if not os.path.exists(os.path.join(snapshot, relative)) or _sha256(os.path.join(snapshot, relative)) != digest]
+    if bad:
+        raise ValueError(f"{snapshot}: checksum mismatch or missing file: {', '.join(bad)}")
+    return [relative for _, relative in sums]
+
+
+def restore_snapshot(snapshot, database=JOB_DB, directory=BACKUP_DIR, safety_backup=True):
+    # Replaces the job database and its archives with the snapshot's. The
+    # snapshot is verified first, and unless safety_backup is off the
+    # current databases are backed up before anything is overwritten (the
+    # returned path). Each file is written through the backup API in one
+    # step, a running app reads either the old or the new version of it.
+    files = verify_snapshot(snapshot)
+    safety = backup_database(database, directory, keep=None) if safety_backup else None
+
+    base = os.path.dirname(database) or '.'
+    restored = set()
+    for relative in files:
+        target = database if relative == os.path.basename(database) else os.path.join(base, relative)
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        source = sqlite3.connect(f"file:{os.path.join(snapshot, relative)}?mode=ro", uri=True)
+        conn = sqlite3.connect(target, timeout=30, isolation_level=None)
+        try:
+            source.backup(conn)
+            conn.execute("PRAGMA journal_mode=WAL")
+            migrate(conn)
+        finally:
+            conn.close()
+            source.close()
+        restored.add(os.path.abspath(target))
+
+    # archives the snapshot didn't have yet would hold jobs twice or jobs
+    # that were deleted since; they are in the safety backup
+    for path in job_databases(database)[1:]:
+        if os.path.abspath(path) not in restored:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+    return safety
+
+
+class BackupScheduler:
+    # Takes a snapshot every `hours` in a daemon thread, the first one when
+    # the newest snapshot is that old. A failed backup is kept in last_error
+    # and tried again at the next interval.
+
+    def __init__(self, hours=BACKUP_HOURS, database=JOB_DB, directory=BACKUP_DIR, keep=BACKUP_KEEP):
+        if hours <= 0:
+            raise ValueError("The backup interval must be a positive number of hours")
+        self.interval = hours * 3600
+        self.database = database
+        self.directory = directory
+        self.keep = keep
+        self.last_snapshot = (snapshots(directory) or [None])[-1]
+        self.last_error = None
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, name="backup-scheduler", daemon=True).start()
+
+    def _due(self):
+        if self.last_snapshot is None:
+            return time.time()
+        return snapshot_time(self.last_snapshot) + self.interval
+
+    def _run(self):
+        while not self._stop.wait(max(0, self._due() - time.time())):
+            try:
+                self.last_snapshot = backup_database(self.database, self.directory, self.keep)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                LOGGER.exception("Backup failed: %s", e)
+                if self._stop.wait(self.interval):
+                    break
+
+    def stop(self):
+        self._stop.set()
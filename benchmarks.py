@@ -0,0 +1,196 @@
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import time
+from datetime import datetime
+import pandas as pd
+import streamlit as st
+import catalog
+import database
+import invoicing
+from catalog import catalog_index, parse_bulk_lines, resolve_bulk_lines, search_catalog
+from database import CATALOG_DB, JOB_DB, count_jobs, delete_job, get_jobs, page_cursor, save_job_to_db
+
+# Times the hot paths of the app against the databases in the current
+# directory (see sample_data for filling them). Query caches are cleared before
+# every run, so the numbers are what a user sees on a cache miss. Results are
+# written as JSON and can be compared with the results of an earlier run.
+
+REPEAT = 5
+REGRESSION_THRESHOLD = 1.25     # a median this much slower than the baseline is a regression
+INVOICE_BATCHES = [1, 50, 500]
+
+
+class Case:
+    # one benchmark: setup runs untimed before every timed call of run
+
+    def __init__(self, name, run, setup=None, repeat=REPEAT):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.repeat = repeat
+
+    def measure(self):
+        timings = []
+        for _ in range(self.repeat):
+            if self.setup:
+                self.setup()
+            start = time.perf_counter()
+            self.run()
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+
+def _stats(timings):
+    timings = sorted(timings)
+    return {
+        'runs': len(timings),
+        'min_ms': round(timings[0], 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'max_ms': round(timings[-1], 3),
+    }
+
+
+def _clear_job_queries():
+    database._cached_jobs.clear()
+    database._cached_job_count.clear()
+
+
+def _job_cases(repeat):
+    with database.connect() as conn:
+        total, latest = conn.execute("SELECT COUNT(*), MAX(job_date) FROM jobs").fetchone()
+        middle = conn.execute("SELECT job_date, job_id FROM jobs ORDER BY job_date DESC, job_id DESC LIMIT 1 OFFSET ?",
+                              (total // 2,)).fetchone()
+    if not total:
+        raise ValueError(f"{JOB_DB} has no jobs, fill it with `python manage.py generate-data` first")
+    latest = datetime.strptime(latest, '%Y-%m-%d')
+    month = ((latest - pd.Timedelta(days=30)).strftime('%Y-%m-%d'), latest.strftime('%Y-%m-%d'))
+    year = ((latest - pd.Timedelta(days=365)).strftime('%Y-%m-%d'), latest.strftime('%Y-%m-%d'))
+    filters = {
+        'first_page': (None, None, None),
+        'last_month': month + (None,),
+        'last_year': year + (None,),
+        'search_client': (None, None, 'Müller'),
+        'search_material': (None, None, 'Kupferrohr'),
+        'search_material_last_year': year + ('Kupferrohr',),
+    }
+
+    cases = []
+    for name, args in filters.items():
+        cases.append(Case(f"get_jobs/{name}", lambda args=args: get_jobs(*args, limit=50), _clear_job_queries, repeat))
+        cases.append(Case(f"count_jobs/{name}", lambda args=args: count_jobs(*args), _clear_job_queries, repeat))
+    cases.append(Case("get_jobs/middle_page", lambda: get_jobs(limit=50, after=tuple(middle)), _clear_job_queries, repeat))
+
+    # the jobs saved by the save benchmark are deleted again by the delete one
+    saved = []
+    job = {'client_name': "Benchmark Client", 'client_address': "Benchmarkweg 1, 8152 Glattbrugg",
+           'job_date': latest.strftime('%Y-%m-%d'), 'job_notes': "benchmark", 'total_amount': 500.0,
+           'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+    items = [{'type': 'catalog', 'description': f"Kupferrohr DN15 (AFNr: 00 - Messing) {n}", 'price': 12.5,
+              'quantity': 4.0, 'article_nr': '100001'} for n in range(8)]
+    items += [{'type': 'work', 'description': "Arbeitszeit Monteur", 'price': 95.0, 'quantity': 2.0}] * 2
+    cases.append(Case("save_job_to_db/10_items", lambda: saved.append(save_job_to_db(job, items)), repeat=repeat))
+    cases.append(Case("delete_job", lambda: delete_job(saved.pop()), repeat=repeat))
+
+    # a first page of search results walked to its next page, as the Next
+    # button does it
+    def next_search_page():
+        get_jobs(None, None, 'Kupferrohr', limit=50, after=page_cursor(get_jobs(None, None, 'Kupferrohr', limit=50)))
+    cases.append(Case("get_jobs/search_next_page", next_search_page, _clear_job_queries, repeat))
+    return cases
+
+
+def _catalog_cases(repeat):
+    with database.connect(CATALOG_DB) as conn:
+        if not catalog.has_catalog(conn):
+            return []
+        numbers = [row[0] for row in conn.execute('SELECT "ArtikelNr" FROM BR_Bauhandel ORDER BY rowid LIMIT 50 OFFSET 1000')]
+    if not numbers:
+        return []
+    bulk = "\n".join(f"{number};2" for number in numbers)
+
+    return [
+        Case("catalog/index_load", catalog_index, catalog._catalog_index.clear, repeat),
+        Case("catalog/complete_prefix", lambda: search_catalog(numbers[0][:4]), repeat=repeat),
+        Case("catalog/search_words", lambda: search_catalog("Kugelhahn DN20 verchromt"), catalog._search.clear, repeat),
+        # resolved from the in-memory index, loaded by the cases above
+        Case("catalog/bulk_50_lines", lambda: resolve_bulk_lines(parse_bulk_lines(bulk)), repeat=repeat),
+    ]
+
+
+def _invoice_cases(repeat):
+    def batch(jobs):
+        os.remove(invoicing.create_invoice_batch(jobs))
+
+    def empty_store():
+        shutil.rmtree(invoicing.STORE.directory, ignore_errors=True)
+
+    cases = []
+    for size in INVOICE_BATCHES:
+        jobs = get_jobs(limit=size).to_dict('records')
+        runs = repeat if size < 100 else min(repeat, 3)
+        cases.append(Case(f"invoices/{size}_rendered", lambda jobs=jobs: batch(jobs), empty_store, runs))
+        cases.append(Case(f"invoices/{size}_from_store", lambda jobs=jobs: batch(jobs), repeat=runs))
+    return cases
+
+
+def _environment():
+    import pypdf
+    import reportlab
+    with database.connect() as conn:
+        jobs, = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()
+        items, = conn.execute("SELECT COUNT(*) FROM job_items").fetchone()
+    with database.connect(CATALOG_DB) as conn:
+        articles = conn.execute("SELECT COUNT(*) FROM BR_Bauhandel").fetchone()[0] if catalog.has_catalog(conn) else 0
+    return {
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'streamlit': st.__version__,
+        'pandas': pd.__version__,
+        'reportlab': reportlab.Version,
+        'pypdf': pypdf.__version__,
+        'machine': platform.platform(),
+        'cpus': os.cpu_count(),
+        'jobs': jobs,
+        'items': items,
+        'articles': articles,
+    }
+
+
+def run_benchmarks(repeat=REPEAT, only=None, report=print):
+    # only: name prefixes of the cases to run. Returns the results document.
+    cases = _job_cases(repeat) + _catalog_cases(repeat) + _invoice_cases(repeat)
+    if only:
+        cases = [case for case in cases if case.name.startswith(tuple(only))]
+
+    results = {}
+    for case in cases:
+        results[case.name] = _stats(case.measure())
+        report(f"{case.name:<40} median {results[case.name]['median_ms']:>10.2f} ms")
+    return {'created': datetime.now().isoformat(timespec='seconds'), 'environment': _environment(), 'results': results}
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    # (name, baseline median, median, ratio, regressed) for every case in both
+    rows = []
+    for name, stats in results['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratio = stats['median_ms'] / base['median_ms'] if base['median_ms'] else float('inf')
+        rows.append((name, base['median_ms'], stats['median_ms'], ratio, ratio > threshold))
+    return rows
+
+
+def save_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
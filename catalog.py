@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import sys
+from array import array
+from bisect import bisect_left
+import streamlit as st
+from catalog_store import build_search_index, has_catalog
+from database import CATALOG_DB, connect, match_expression
+from instrumentation import timed
+
+# Lookups in the BR_Bauhandel supplier catalog. Article numbers are completed
+# from an in-memory index of the whole catalog; other searches go through an
+# FTS5 trigram index over article numbers and descriptions, so any fragment of
+# at least three characters is found without scanning the table.
+
+# columns of a catalog item, in the order the Job Entry page keeps them
+ITEM_COLUMNS = '"ArtikelNr", "Preis", "Beschreibung", "AFNr", "AF Bezeichnung"'
+SEARCH_COLUMNS = 'c."ArtikelNr", c."Preis", c."Beschreibung", c."AFNr", c."AF Bezeichnung"'
+SEARCH_LIMIT = 25
+
+def catalog_version():
+    # changes whenever the catalog database is written (WAL writes only touch
+    # the -wal file until the next checkpoint)
+    mtimes = [os.path.getmtime(p) for p in (CATALOG_DB, CATALOG_DB + '-wal') if os.path.exists(p)]
+    return max(mtimes, default=0)
+
+
+@st.cache_resource(max_entries=4)
+def _search_index_ready(version):
+    with connect(CATALOG_DB) as conn:
+        if not has_catalog(conn):
+            return False
+        build_search_index(conn)
+        conn.commit()
+        return True
+
+
+class CatalogIndex:
+    # The catalog held in memory as columns sorted by (ArtikelNr, AFNr):
+    # prices in a float array, repeated texts interned. Article number
+    # prefixes and the items of an article are found by bisecting the sorted
+    # numbers, a single item by a dict from (ArtikelNr, AFNr) to its row.
+
+    def __init__(self, rows):
+        rows = sorted(((str(r[0]), str(r[3])) + tuple(r) for r in rows), key=lambda r: (r[0], r[1]))
+        self.artikel = [sys.intern(r[0]) for r in rows]
+        self.afnr = [sys.intern(r[1]) for r in rows]
+        self.prices = array('d', (float('nan') if r[3] is None else float(r[3]) for r in rows))
+        self.descriptions = [r[4] for r in rows]
+        self.af_names = [sys.intern(r[6] or '') for r in rows]
+        self._rows = {(a, f): i for i, (a, f) in enumerate(zip(self.artikel, self.afnr))}
+
+    def __len__(self):
+        return len(self.artikel)
+
+    def _item(self, i):
+        price = self.prices[i]
+        return (self.artikel[i], None if price != price else price, self.descriptions[i],
+                self.afnr[i], self.af_names[i])
+
+    def item(self, artikel, afnr):
+        # (ArtikelNr, Preis, Beschreibung, AFNr, AF Bezeichnung) or None
+        i = self._rows.get((str(artikel), str(afnr)))
+        return None if i is None else self._item(i)
+
+    def items(self, artikel):
+        # every item of the article number, in AFNr order
+        artikel = str(artikel)
+        items = []
+        i = bisect_left(self.artikel, artikel)
+        while i < len(self.artikel) and self.artikel[i] == artikel:
+            items.append(self._item(i))
+            i += 1
+        return items
+
+    def complete(self, prefix, limit=SEARCH_LIMIT):
+        # items whose article number starts with prefix, in article order
+        items = []
+        i = bisect_left(self.artikel, prefix)
+        while i < len(self.artikel) and len(items) < limit and self.artikel[i].startswith(prefix):
+            items.append(self._item(i))
+            i += 1
+        return items
+
+
+@st.cache_resource(max_entries=1)
+def _catalog_index(version):
+    with connect(CATALOG_DB) as conn:
+        if not has_catalog(conn):
+            return CatalogIndex([])
+        return CatalogIndex(conn.execute(f"SELECT {ITEM_COLUMNS} FROM BR_Bauhandel"))
+
+
+@timed('catalog_index')
+def catalog_index():
+    # loaded once per process, and again after the catalog file has changed
+    return _catalog_index(catalog_version())
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _search(version, term, limit):
+    if not _search_index_ready(version):
+        return []
+    match = match_expression(term)
+    with connect(CATALOG_DB) as conn:
+        if match:
+            # best matches first (bm25), the price comes along so adding the
+            # item needs no further lookup
+            query = f'''SELECT {SEARCH_COLUMNS}
+                        FROM BR_Bauhandel_fts f JOIN BR_Bauhandel c ON c.rowid = f.rowid
+                        WHERE BR_Bauhandel_fts MATCH ?
+                        ORDER BY f.rank LIMIT ?'''
+            return conn.execute(query, (match, limit)).fetchall()
+        # too short for the index: exact article or AF number
+        query = f'SELECT {ITEM_COLUMNS} FROM BR_Bauhandel WHERE "ArtikelNr" = ? OR "AFNr" = ? LIMIT ?'
+        return conn.execute(query, (term, term, limit)).fetchall()
+
+
+@timed('search_catalog')
+def search_catalog(term, limit=SEARCH_LIMIT):
+    # rows of (ArtikelNr, Preis, Beschreibung, AFNr, AF Bezeichnung)
+    term = term.strip()
+    if not term:
+        return []
+    try:
+        # a single word is tried as an article number first, in memory
+        if " " not in term:
+            items = catalog_index().complete(term, limit)
+            if items:
+                return items
+        return _search(catalog_version(), term, limit)
+    except sqlite3.OperationalError as e:
+        st.error(f"Catalog search failed: {str(e)}")
+        return []
+
+
+def parse_bulk_lines(text):
+    # One article per line, "ArtikelNr[;AFNr];qty" (tabs work as well). A line
+    # with just the article number, as a barcode scanner sends it, means one
+    # piece. Returns dicts with line, artikel, afnr, quantity and error.
+    lines = []
+    for number, raw in enumerate(text.splitlines(), start=1):
+        fields = [f.strip() for f in raw.replace('\t', ';').split(';')]
+        if not any(fields):
+            continue
+        line = {'line': number, 'artikel': fields[0], 'afnr': None, 'quantity': 1.0, 'error': None}
+        if len(fields) > 3:
+            line['error'] = "too many fields"
+        elif len(fields) >= 2:
+            if len(fields) == 3:
+                line['afnr'] = fields[1] or None
+            try:
+                line['quantity'] = float(fields[-1].replace(',', '.'))
+            except ValueError:
+                line['error'] = f"invalid quantity '{fields[-1]}'"
+        lines.append(line)
+    return lines
+
+
+@timed('resolve_bulk_lines')
+def resolve_bulk_lines(lines):
+    # Adds status ('ok', 'ambiguous', 'unknown' or 'invalid') and the
+    # matching catalog item to every parsed line, from the in-memory index
+    index = catalog_index()
+    for line in lines:
+        if line['afnr'] is not None:
+            item = index.item(line['artikel'], line['afnr'])
+            candidates = [item] if item else []
+        else:
+            candidates = index.items(line['artikel'])
+        line['item'] = candidates[0] if len(candidates) == 1 else None
+        if line['error']:
+            line['status'] = 'invalid'
+        elif not candidates:
+            line['status'] = 'unknown'
+            line['error'] = "not in the catalog"
+        elif len(candidates) > 1:
+            line['status'] = 'ambiguous'
+            line['error'] = "AFNr needed: " + ", ".join(str(row[3]) for row in candidates)
+        else:
+            line['status'] = 'ok'
+    return lines
@@ -0,0 +1,168 @@
+import csv
+import itertools
+import os
+import sqlite3
+from catalog_store import INDEXES, SEARCH_TRIGGERS, build_search_index
+
+# Loads the supplier's price list (CSV or Excel) into the BR_Bauhandel table.
+# The file is streamed in chunks into a staging table first; the catalog
+# itself is only locked for the transaction that applies the difference and
+# builds the indexes, and in WAL mode the Job Entry page keeps reading the
+# previous catalog with its indexes until that commits.
+
+COLUMNS = ['ArtikelNr', 'AFNr', 'AF Bezeichnung', 'Beschreibung', 'Preis']
+KEY = ['ArtikelNr', 'AFNr']
+CHUNK_SIZE = 10000
+
+
+def _quoted(columns):
+    return ", ".join(f'"{col}"' for col in columns)
+
+
+def _price(value):
+    # Swiss price lists come with either decimal point or comma
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(str(value).replace("'", "").replace(",", "."))
+
+
+def _csv_rows(path, encoding, delimiter):
+    with open(path, newline='', encoding=encoding) as f:
+        if delimiter is None:
+            delimiter = csv.Sniffer().sniff(f.read(65536), delimiters=';,\t').delimiter
+            f.seek(0)
+        yield from csv.reader(f, delimiter=delimiter)
+
+
+def _excel_rows(path, sheet):
+    # read-only mode streams the rows instead of loading the whole workbook
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        yield from worksheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_price_list(path, sheet=None, encoding='utf-8-sig', delimiter=None):
+    # yields one tuple per article in the order of COLUMNS
+    if os.path.splitext(path)[1].lower() in ('.xlsx', '.xlsm'):
+        rows = _excel_rows(path, sheet)
+    else:
+        rows = _csv_rows(path, encoding, delimiter)
+
+    header = [str(name).strip() if name is not None else '' for name in next(rows)]
+    missing = [col for col in COLUMNS if col not in header]
+    if missing:
+        raise ValueError(f"Price list is missing the columns: {', '.join(missing)}")
+    positions = [header.index(col) for col in COLUMNS]
+    price = COLUMNS.index('Preis')
+
+    for row in rows:
+        if not any(row):
+            continue
+        values = [row[pos] if pos < len(row) else None for pos in positions]
+        values = [str(v).strip() if v is not None and i != price else v for i, v in enumerate(values)]
+        values[price] = _price(values[price])
+        yield tuple(values)
+
+
+def _stage(conn, rows):
+    # the staging table lives in the temp database, duplicates in the price
+    # list are collapsed onto the last occurrence
+    conn.execute("DROP TABLE IF EXISTS temp.catalog_staging")
+    conn.execute('''CREATE TEMP TABLE catalog_staging
+                     ("ArtikelNr" TEXT, "AFNr" TEXT, "AF Bezeichnung" TEXT, "Beschreibung" TEXT, "Preis" REAL,
+                      PRIMARY KEY ("ArtikelNr", "AFNr"))''')
+    insert = f"INSERT OR REPLACE INTO temp.catalog_staging ({_quoted(COLUMNS)}) VALUES (?, ?, ?, ?, ?)"
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, CHUNK_SIZE))
+        if not chunk:
+            break
+        conn.executemany(insert, chunk)
+    conn.commit()
+    return conn.execute("SELECT COUNT(*) FROM temp.catalog_staging").fetchone()[0]
+
+
+def _full_load(conn):
+    # Replaces the whole catalog. The search triggers and indexes are dropped
+    # so they aren't maintained per row, load_catalog builds them again in
+    # the same transaction.
+    for trigger in SEARCH_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS BR_Bauhandel_fts")
+    conn.execute("DROP INDEX IF EXISTS idx_BR_Bauhandel_artikel_afnr")
+    conn.execute("DROP INDEX IF EXISTS idx_BR_Bauhandel_afnr")
+    conn.execute("DELETE FROM BR_Bauhandel")
+    conn.execute(f"INSERT INTO BR_Bauhandel ({_quoted(COLUMNS)}) SELECT {_quoted(COLUMNS)} FROM temp.catalog_staging")
+    return {'inserted': conn.execute("SELECT changes()").fetchone()[0], 'updated': 0, 'deleted': 0}
+
+
+def _apply_changes(conn, keep_missing):
+    # Only rows that differ from the staged price list are written, the
+    # search triggers update the index for exactly those rows.
+    match = " AND ".join(f'c."{col}" = s."{col}"' for col in KEY)
+    changed = " OR ".join(f'c."{col}" IS NOT s."{col}"' for col in COLUMNS if col not in KEY)
+    assignments = ", ".join(f'"{col}" = s."{col}"' for col in COLUMNS if col not in KEY)
+
+    conn.execute(f'''UPDATE BR_Bauhandel AS c SET {assignments}
+                     FROM temp.catalog_staging AS s
+                     WHERE {match} AND ({changed})''')
+    updated = conn.execute("SELECT changes()").fetchone()[0]
+
+    conn.execute(f'''INSERT INTO BR_Bauhandel ({_quoted(COLUMNS)})
+                     SELECT {_quoted(COLUMNS)} FROM temp.catalog_staging AS s
+                     WHERE NOT EXISTS (SELECT 1 FROM BR_Bauhandel AS c WHERE {match})''')
+    inserted = conn.execute("SELECT changes()").fetchone()[0]
+
+    deleted = 0
+    if not keep_missing:
+        conn.execute(f'''DELETE FROM BR_Bauhandel AS c
+                         WHERE NOT EXISTS (SELECT 1 FROM temp.catalog_staging AS s WHERE {match})''')
+        deleted = conn.execute("SELECT changes()").fetchone()[0]
+
+    return {'inserted': inserted, 'updated': updated, 'deleted': deleted}
+
+
+def load_catalog(database, path, sheet=None, encoding='utf-8-sig', delimiter=None, full=False, keep_missing=False):
+    # returns the number of rows read and inserted / updated / deleted
+    conn = sqlite3.connect(database, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''CREATE TABLE IF NOT EXISTS BR_Bauhandel
+                         ("ArtikelNr" TEXT, "AFNr" TEXT, "AF Bezeichnung" TEXT, "Beschreibung" TEXT, "Preis" REAL)''')
+        staged = _stage(conn, read_price_list(path, sheet, encoding, delimiter))
+
+        empty = conn.execute("SELECT NOT EXISTS (SELECT 1 FROM BR_Bauhandel)").fetchone()[0]
+        incremental = not (full or empty)
+
+        # The rows, the lookup indexes and the search index change in one
+        # transaction, readers never see the catalog without its indexes.
+        # The diff looks up every staged row by (ArtikelNr, AFNr), a full
+        # load builds the indexes after the rows are in.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if incremental:
+                for statement in INDEXES:
+                    conn.execute(statement)
+                counts = _apply_changes(conn, keep_missing)
+            else:
+                counts = _full_load(conn)
+                for statement in INDEXES:
+                    conn.execute(statement)
+            build_search_index(conn)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        conn.execute("ANALYZE BR_Bauhandel")
+        conn.commit()
+        counts['read'] = staged
+        return counts
+    finally:
+        conn.close()
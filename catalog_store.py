@@ -0,0 +1,52 @@
+# The supplier catalog's schema without any Streamlit: the search index and
+# the lookup indexes of BR_Bauhandel. catalog.py searches it for the pages,
+# catalog_loader.py builds it when a price list is loaded.
+
+# external content table: the index stores only the tokens and reads the
+# columns from BR_Bauhandel, the triggers keep it in step with the table.
+# Single statements rather than a script, executescript would commit the
+# caller's transaction first.
+SEARCH_INDEX = (
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS BR_Bauhandel_fts USING fts5(
+        "ArtikelNr", "AFNr", "Beschreibung", "AF Bezeichnung",
+        content='BR_Bauhandel', content_rowid='rowid', tokenize='trigram')''',
+
+    '''CREATE TRIGGER IF NOT EXISTS BR_Bauhandel_fts_insert AFTER INSERT ON BR_Bauhandel BEGIN
+        INSERT INTO BR_Bauhandel_fts (rowid, "ArtikelNr", "AFNr", "Beschreibung", "AF Bezeichnung")
+        VALUES (new.rowid, new."ArtikelNr", new."AFNr", new."Beschreibung", new."AF Bezeichnung");
+    END''',
+
+    '''CREATE TRIGGER IF NOT EXISTS BR_Bauhandel_fts_delete AFTER DELETE ON BR_Bauhandel BEGIN
+        INSERT INTO BR_Bauhandel_fts (BR_Bauhandel_fts, rowid, "ArtikelNr", "AFNr", "Beschreibung", "AF Bezeichnung")
+        VALUES ('delete', old.rowid, old."ArtikelNr", old."AFNr", old."Beschreibung", old."AF Bezeichnung");
+    END''',
+
+    '''CREATE TRIGGER IF NOT EXISTS BR_Bauhandel_fts_update AFTER UPDATE ON BR_Bauhandel BEGIN
+        INSERT INTO BR_Bauhandel_fts (BR_Bauhandel_fts, rowid, "ArtikelNr", "AFNr", "Beschreibung", "AF Bezeichnung")
+        VALUES ('delete', old.rowid, old."ArtikelNr", old."AFNr", old."Beschreibung", old."AF Bezeichnung");
+        INSERT INTO BR_Bauhandel_fts (rowid, "ArtikelNr", "AFNr", "Beschreibung", "AF Bezeichnung")
+        VALUES (new.rowid, new."ArtikelNr", new."AFNr", new."Beschreibung", new."AF Bezeichnung");
+    END''',
+)
+
+SEARCH_TRIGGERS = ['BR_Bauhandel_fts_insert', 'BR_Bauhandel_fts_delete', 'BR_Bauhandel_fts_update']
+
+# the lookups by article number (and AFNr), by AF number alone
+INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_BR_Bauhandel_artikel_afnr ON BR_Bauhandel ("ArtikelNr", "AFNr")',
+    'CREATE INDEX IF NOT EXISTS idx_BR_Bauhandel_afnr ON BR_Bauhandel ("AFNr")',
+)
+
+
+def has_catalog(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'BR_Bauhandel'").fetchone() is not None
+
+
+def build_search_index(conn):
+    # creates the search index if it's missing and fills it from the table,
+    # inside the caller's transaction
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'BR_Bauhandel_fts'").fetchone()
+    for statement in SEARCH_INDEX:
+        conn.execute(statement)
+    if not exists:
+        conn.execute("INSERT INTO BR_Bauhandel_fts (BR_Bauhandel_fts) VALUES ('rebuild')")
@@ -0,0 +1,118 @@
+import json
+import streamlit as st
+import pandas as pd
+import job_store
+from instrumentation import timed
+from job_store import (CATALOG_DB, JOB_DB, JOB_ORDERS, QUERY_CACHE_TTL, archive_batches, archives_for, attach_archives,
+                       connect, count_jobs_query, data_version, items_json, match_expression, select_jobs)
+
+# The job database as the pages use it: query results are cached, failed
+# writes are shown on the page. The database work itself is in job_store.
+
+# Job list queries are cached per filter combination. Writes go through this
+# module and bump the data version, which is part of every cache key, so stale
+# results are never served; QUERY_CACHE_TTL only bounds how long a change
+# made by another process can go unnoticed.
+QUERY_CACHE_ENTRIES = 256
+
+
+def _jobs_with_items(conn, schemas, jobs_query, params, order):
+    # The items of every job come along as a JSON array, so the page and the
+    # invoices get them in the same round trip
+    query = f"SELECT j.*, {items_json(schemas)} as items FROM ({jobs_query}) j ORDER BY {order}"
+    jobs = pd.read_sql_query(query, conn, params=params)
+    jobs['items'] = jobs['items'].map(json.loads)
+    return jobs
+
+
+@st.cache_data(ttl=QUERY_CACHE_TTL, max_entries=QUERY_CACHE_ENTRIES, show_spinner=False)
+def _cached_jobs(version, date_from, date_to, search_term, limit, after):
+    # Jobs newest first, search results best match first. With a limit this
+    # returns one page: `after` is the page_cursor of the previous page, so
+    # SQLite seeks straight to the next row (in idx_jobs_date_job_id, or in
+    # rank order) instead of skipping OFFSET rows. Archives are only read if
+    # the dates reach back into their year.
+    order = 'rank' if match_expression(search_term or '') else 'newest'
+    with connect() as conn:
+        schemas = attach_archives(conn, archives_for(date_from, date_to))
+        query, params = select_jobs(schemas, (date_from, date_to, search_term), order, after, limit)
+        return _jobs_with_items(conn, schemas, query, params, JOB_ORDERS[order][1])
+
+
+@st.cache_data(ttl=QUERY_CACHE_TTL, max_entries=QUERY_CACHE_ENTRIES, show_spinner=False)
+def _cached_job_count(version, date_from, date_to, search_term):
+    with connect() as conn:
+        schemas = attach_archives(conn, archives_for(date_from, date_to))
+        query, params = count_jobs_query(schemas, (date_from, date_to, search_term))
+        return conn.execute(query, params).fetchone()[0]
+
+
+@timed('get_jobs')
+def get_jobs(date_from=None, date_to=None, search_term=None, limit=None, after=None):
+    return _cached_jobs(data_version(), date_from, date_to, search_term, limit, after)
+
+
+@timed('count_jobs')
+def count_jobs(date_from=None, date_to=None, search_term=None):
+    return _cached_job_count(data_version(), date_from, date_to, search_term)
+
+
+def page_cursor(jobs):
+    # the `after` of get_jobs for the page following these jobs
+    last = jobs.iloc[-1]
+    if 'search_rank' in jobs:
+        return (float(last['search_rank']), last['job_id'])
+    return (last['job_date'], last['job_id'])
+
+
+def delete_job(job_id):
+    try:
+        job_store.delete_job(job_id)
+        return True
+    except Exception as e:
+        st.error(f"Error deleting job: {str(e)}")
+        return False
+
+
+# The bulk actions of the pages: each returns what its undo needs (the number
+# of jobs deleted, the previous dates and statuses) or None if it failed
+
+def delete_jobs(job_ids):
+    try:
+        return job_store.delete_jobs(job_ids)
+    except Exception as e:
+        st.error(f"Error deleting jobs: {str(e)}")
+        return None
+
+
+def restore_deleted_jobs(job_ids):
+    try:
+        return job_store.restore_deleted_jobs(job_ids)
+    except Exception as e:
+        st.error(f"Error restoring jobs: {str(e)}")
+        return None
+
+
+def update_jobs(job_ids, job_date=None, status=None):
+    try:
+        return job_store.update_jobs(job_ids, job_date, status)
+    except Exception as e:
+        st.error(f"Error updating jobs: {str(e)}")
+        return None
+
+
+def restore_jobs(previous):
+    try:
+        return job_store.restore_jobs(previous)
+    except Exception as e:
+        st.error(f"Error restoring jobs: {str(e)}")
+        return None
+
+
+def save_job_to_db(job_data, items_data):
+    # returns the job_id or False
+    try:
+        return job_store.save_job(job_data, items_data)
+    except Exception as e:
+        st.error(f"Error saving job data: {str(e)}")
+        return False
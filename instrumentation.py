@@ -0,0 +1,205 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+# Opt-in timing of database statements, data access functions, invoice
+# rendering and page runs. Switched on with PLUMBY_INSTRUMENTATION=1; without
+# it connections are plain sqlite3 connections and `timed` leaves functions
+# untouched, so nothing is measured and nothing costs. Statements slower than
+# PLUMBY_SLOW_QUERY_MS go to the slow log together with their query plan.
+
+ENABLED = os.environ.get('PLUMBY_INSTRUMENTATION') == '1'
+SLOW_QUERY_MS = float(os.environ.get('PLUMBY_SLOW_QUERY_MS', 100))
+SLOW_LOG = os.environ.get('PLUMBY_SLOW_LOG', 'slow_queries.log')
+SAMPLES = 1000          # durations kept per operation / statement
+
+# errors of work the app does in the background (the backup scheduler); until
+# logging is configured Python prints warnings and errors to stderr
+LOGGER = logging.getLogger('plumby')
+
+
+class Metrics:
+    # the latest durations (ms) per name, shared by all threads of the process
+
+    def __init__(self, samples=SAMPLES):
+        self._samples = samples
+        self._durations = defaultdict(lambda: deque(maxlen=self._samples))
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, name, ms):
+        with self._lock:
+            self._durations[name].append(ms)
+            self._counts[name] += 1
+
+    def summary(self, prefix=''):
+        # rows of name, count, p50, p95 and max (ms) over the kept durations
+        with self._lock:
+            items = [(name, self._counts[name], sorted(d)) for name, d in self._durations.items() if name.startswith(prefix)]
+        return [{'name': name[len(prefix):], 'count': count, 'p50_ms': _percentile(d, 0.5),
+                 'p95_ms': _percentile(d, 0.95), 'max_ms': d[-1]} for name, count, d in sorted(items)]
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+METRICS = Metrics()
+_current = threading.local()        # name of the operation running in this thread
+_log_lock = threading.Lock()
+
+
+@contextmanager
+def measure(name):
+    # times the block as operation `name`, statements inside it are logged
+    # under that name; a block left by an exception (st.rerun included) counts
+    if not ENABLED:
+        yield
+        return
+    outer = getattr(_current, 'operation', None)
+    _current.operation = name
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        METRICS.record(f"op:{name}", (time.perf_counter() - start) * 1000)
+        _current.operation = outer
+
+
+def timed(name):
+    # decorator: times every call of the function when instrumentation is on
+    def decorate(func):
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with measure(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _statement_name(sql):
+    return " ".join(sql.split())[:200]
+
+
+def _log_slow(conn, sql, params, ms):
+    try:
+        plan = [row[3] for row in sqlite3.Cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    except sqlite3.Error as e:         # e.g. statements that can't be explained
+        plan = [f"no plan: {e}"]
+    entry = {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'operation': getattr(_current, 'operation', None),
+        'ms': round(ms, 2),
+        'sql': _statement_name(sql),
+        'params': [str(p)[:100] for p in params] if isinstance(params, (list, tuple)) else str(params)[:200],
+        'plan': plan,
+    }
+    with _log_lock, open(SLOW_LOG, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    # A statement's time is its execute plus all fetches of its rows, it's
+    # recorded when the rows are exhausted, the next statement starts or the
+    # cursor goes away.
+
+    _pending = None
+
+    def _finish(self):
+        if self._pending is not None:
+            sql, params, ms = self._pending
+            self._pending = None
+            METRICS.record(f"sql:{_statement_name(sql)}", ms)
+            if ms >= SLOW_QUERY_MS:
+                _log_slow(self.connection, sql, params, ms)
+
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        rows = fetch(*args)
+        if self._pending is not None:
+            self._pending[2] += (time.perf_counter() - start) * 1000
+        return rows
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        self._pending = [sql, parameters, (time.perf_counter() - start) * 1000]
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._pending = [sql, (), (time.perf_counter() - start) * 1000]
+        self._finish()
+        return self
+
+    def fetchone(self):
+        row = self._timed_fetch(super().fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed_fetch(super().fetchmany, self.arraysize if size is None else size)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(super().fetchall)
+        self._finish()
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # pandas asks for a cursor, the execute shortcuts would bypass cursor()
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    # factory for sqlite3.connect
+    return InstrumentedConnection if ENABLED else sqlite3.Connection
+
+
+def read_slow_log(limit=100):
+    # the latest entries, newest first
+    try:
+        with open(SLOW_LOG, encoding='utf-8') as f:
+            lines = deque(f, maxlen=limit)
+    except FileNotFoundError:
+        return []
+    return [json.loads(line) for line in reversed(lines)]
@@ -0,0 +1,106 @@
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+import streamlit as st
+from instrumentation import measure
+from invoicing import render_invoices, write_batch
+
+# Invoice batches are generated by worker threads in the background instead of
+# inside the page's script run. The queue is shared by all sessions, so a
+# finished batch stays downloadable after reruns, page switches and from other
+# browser tabs until it's pruned.
+
+BATCH_DIR = 'invoice_batches'
+WORKERS = 2
+KEEP_BATCHES = 50
+
+
+class InvoiceBatch:
+
+    def __init__(self, jobs, output):
+        self.id = uuid.uuid4().hex
+        self.jobs = jobs
+        self.output = output
+        self.total = len(jobs)
+        self.done = 0
+        self.status = 'queued'      # queued -> running -> done / failed
+        self.path = None
+        self.error = None
+        self.created = time.time()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    @property
+    def file_name(self):
+        return f"invoices_{time.strftime('%Y%m%d_%H%M%S', time.localtime(self.created))}.{self.output}"
+
+
+class InvoiceQueue:
+
+    def __init__(self, workers=WORKERS, directory=BATCH_DIR):
+        self.directory = directory
+        self.batches = {}           # id -> batch, oldest first
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        for n in range(workers):
+            threading.Thread(target=self._work, name=f"invoice-worker-{n}", daemon=True).start()
+
+    def submit(self, jobs, output='pdf'):
+        # jobs: records as returned by database.get_jobs, returns the batch id
+        batch = InvoiceBatch(list(jobs), output)
+        with self._lock:
+            self.batches[batch.id] = batch
+        self._queue.put(batch)
+        return batch.id
+
+    def get(self, batch_id):
+        return self.batches.get(batch_id)
+
+    def recent(self, limit=20):
+        with self._lock:
+            return list(self.batches.values())[::-1][:limit]
+
+    def busy(self):
+        with self._lock:
+            return any(not batch.finished for batch in self.batches.values())
+
+    def _count(self, batch, rendered):
+        for job, pdf in rendered:
+            batch.done += 1
+            yield job, pdf
+
+    def _work(self):
+        while True:
+            batch = self._queue.get()
+            batch.status = 'running'
+            try:
+                with measure(f"invoice_batch_{batch.output}"):
+                    path = write_batch(self._count(batch, render_invoices(batch.jobs)), batch.output)
+                os.makedirs(self.directory, exist_ok=True)
+                batch.path = shutil.move(path, os.path.join(self.directory, f"{batch.id}.{batch.output}"))
+                batch.status = 'done'
+            except Exception as e:
+                batch.error = str(e)
+                batch.status = 'failed'
+            finally:
+                batch.jobs = None
+                self._prune()
+
+    def _prune(self):
+        # forget the oldest finished batches and remove their files
+        with self._lock:
+            finished = [batch for batch in self.batches.values() if batch.finished]
+            for batch in finished[:max(0, len(finished) - KEEP_BATCHES)]:
+                del self.batches[batch.id]
+                if batch.path and os.path.exists(batch.path):
+                    os.remove(batch.path)
+
+
+@st.cache_resource
+def get_queue():
+    return InvoiceQueue()
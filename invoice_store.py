@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import tempfile
+
+# On-disk store of rendered invoice PDFs. A PDF is filed under a hash of
+# everything that goes into it (the job fields and item fields the invoice
+# shows and the template version), so an unchanged job is never rendered
+# twice and a changed one can't be served from a stale file. The file's
+# mtime is its last use, the least recently used files are removed once the
+# store outgrows its budget.
+
+STORE_DIR = 'invoice_cache'
+MAX_STORE_BYTES = 500 * 1024 * 1024
+
+# what invoicing.invoice_story prints; other columns (status, deleted_at, the
+# search_rank of a searched list) don't change the PDF and stay out of the key
+INVOICE_FIELDS = ('job_id', 'job_date', 'client_name', 'client_address', 'total_amount')
+ITEM_FIELDS = ('description', 'quantity', 'price')
+
+
+def invoice_key(job, template_version):
+    content = {
+        'template': template_version,
+        'job': {field: job[field] for field in INVOICE_FIELDS},
+        'items': [[item[field] for field in ITEM_FIELDS] for item in job['items']],
+    }
+    encoded = json.dumps(content, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class InvoiceStore:
+
+    def __init__(self, directory=STORE_DIR, max_bytes=MAX_STORE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def get(self, key):
+        # path of the stored PDF or None, a hit counts as use
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def read(self, key):
+        path = self.get(key)
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def put(self, key, pdf):
+        # written to a temp file first and renamed, readers never see half a PDF
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp, self.path(key))
+        return self.path(key)
+
+    def evict(self):
+        # removes the least recently used PDFs until the store fits its budget
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith('.pdf')]
+        except FileNotFoundError:
+            return 0
+        stats = []
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:      # removed by a concurrent eviction
+                continue
+            stats.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in stats)
+        removed = 0
+        for _, size, path in sorted(stats):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,208 @@
+import io
+import itertools
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pypdf import PdfWriter
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet
+from instrumentation import timed
+from invoice_store import InvoiceStore, invoice_key
+
+# Invoice PDFs. Every invoice is rendered as its own document and kept in the
+# invoice store, batches are spread over a process pool and then merged into
+# one PDF or zipped.
+
+# Built once per process and shared by every invoice, they never change
+STYLES = getSampleStyleSheet()
+
+HEADER = [
+    Paragraph("DÜBENDORFER SANITÄR-SERVICE GmbH", STYLES['Heading1']),
+    Paragraph("Glattwiesenstrasse 20, 8152 Glattbrugg", STYLES['Normal']),
+    Paragraph("Tel: 076 388 95 60", STYLES['Normal']),
+    Spacer(1, 20),
+]
+
+BANK_DETAILS = [
+    Paragraph("Bank Details:", STYLES['Normal']),
+    Paragraph("Bank: UBS Switzerland AG", STYLES['Normal']),
+    Paragraph("IBAN: CH85 0028 3283 1127 5501 Y", STYLES['Normal']),
+    Paragraph("BIC: UBSWCHZH80A", STYLES['Normal']),
+    Paragraph("MWST-Nr.: CHE-257.523.928", STYLES['Normal']),
+    Spacer(1, 30),
+]
+
+ITEM_TABLE_STYLE = [
+    ('FONT', (0,0), (-1,-1), 'Helvetica'),
+    ('FONTSIZE', (0,0), (-1,-1), 10),
+    ('GRID', (0,0), (-1,-2), 1, colors.black),
+    ('BACKGROUND', (0,0), (-1,0), colors.grey),
+    ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+]
+
+# part of every stored invoice's key, bump it whenever the layout changes
+TEMPLATE_VERSION = 1
+STORE = InvoiceStore()
+
+# smaller batches are rendered right away, starting the pool would take longer
+PARALLEL_THRESHOLD = 8
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+# write_invoice_files renders this many jobs at a time, so an iterator over any
+# number of jobs never has more than one chunk of jobs and PDFs in memory
+FILE_CHUNK = 200
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def invoice_story(job):
+    # job is a dict with the columns of a jobs row and its list of items
+    elements = list(HEADER)
+
+    # Client Info
+    elements.append(Paragraph("Bill To:", STYLES['Normal']))
+    elements.append(Paragraph(job['client_name'], STYLES['Normal']))
+    elements.append(Paragraph(job['client_address'], STYLES['Normal']))
+    elements.append(Spacer(1, 20))
+
+    # Invoice Details
+    elements.append(Paragraph(f"Invoice #: {job['job_id']}", STYLES['Normal']))
+    elements.append(Paragraph(f"Date: {job['job_date']}", STYLES['Normal']))
+    elements.append(Spacer(1, 20))
+
+    # Items Table
+    data = [['Description', 'Quantity', 'Price', 'Total']]
+    for item in job['items']:
+        total = float(item['price']) * float(item['quantity'])
+        data.append([
+            item['description'],
+            f"{float(item['quantity']):.2f}",
+            f"CHF {float(item['price']):.2f}",
+            f"CHF {total:.2f}"
+        ])
+    data.append(['', '', 'Total:', f"CHF {float(job['total_amount']):.2f}"])
+
+    table = Table(data, colWidths=[250, 75, 100, 100])
+    table.setStyle(ITEM_TABLE_STYLE)
+
+    elements.append(table)
+    elements.append(Spacer(1, 20))
+    elements.extend(BANK_DETAILS)
+    return elements
+
+
+def build_pdf(story, **page):
+    # reportlab marks a flowable it had to move to the next page and never
+    # removes the mark; left on the shared HEADER or BANK_DETAILS it makes the
+    # next document that needs the same move fail as "too large"
+    buffer = io.BytesIO()
+    try:
+        SimpleDocTemplate(buffer, pagesize=A4, **page).build(story)
+    finally:
+        for flowable in HEADER + BANK_DETAILS:
+            flowable.__dict__.pop('_postponed', None)
+    return buffer.getvalue()
+
+
+@timed('render_invoice')
+def render_invoice(job):
+    return build_pdf(invoice_story(job))
+
+
+def _pool():
+    # started on first use and kept for the lifetime of the process; spawn
+    # instead of fork so the workers don't inherit the server's threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=get_context('spawn'))
+    return _executor
+
+
+def render_parallel(render, documents):
+    # render(document) for every document, in their order; render must be a
+    # module level function so the pool's workers can import it
+    if len(documents) < PARALLEL_THRESHOLD:
+        return map(render, documents)
+    return _pool().map(render, documents, chunksize=max(1, len(documents) // (MAX_WORKERS * 4)))
+
+
+def render_invoices(jobs, store=STORE):
+    # Yields (job, pdf bytes) in the order of jobs. Invoices already in the
+    # store are read from disk, only the others are rendered (and stored).
+    jobs = list(jobs)
+    keys = [invoice_key(job, TEMPLATE_VERSION) for job in jobs]
+    cached = [store.get(key) for key in keys]
+    rendered = render_parallel(render_invoice, [job for job, path in zip(jobs, cached) if path is None])
+
+    for job, key, path in zip(jobs, keys, cached):
+        if path is None:
+            pdf = next(rendered)
+            store.put(key, pdf)
+        else:
+            # evicted in the meantime by another batch: render it here
+            pdf = store.read(key) or render_invoice(job)
+        yield job, pdf
+
+    store.evict()
+
+
+def invoice_filename(job):
+    return f"invoice_{job['job_id']}.pdf"
+
+
+def merge_pdfs(pdfs, out):
+    # Writes the pages of the pdfs (bytes each) into the binary file out as
+    # one PDF. The invoices come in one at a time, the merged document is
+    # held by the writer until it is written; large runs go out as a zip.
+    writer = PdfWriter()
+    for pdf in pdfs:
+        writer.append(io.BytesIO(pdf))
+    writer.write(out)
+
+
+def write_batch(rendered, output='pdf'):
+    # Writes (job, pdf) pairs into a temp file, either merged into one PDF or
+    # as one PDF per invoice in a zip. Returns the path, the caller removes it.
+    suffix = '.zip' if output == 'zip' else '.pdf'
+    with tempfile.NamedTemporaryFile(suffix=suffix, prefix='invoices_', delete=False) as out:
+        if output == 'zip':
+            with zipfile.ZipFile(out, 'w') as archive:
+                for job, pdf in rendered:
+                    archive.writestr(invoice_filename(job), pdf)
+        else:
+            merge_pdfs((pdf for job, pdf in rendered), out)
+    return out.name
+
+
+@timed('create_invoice_batch')
+def create_invoice_batch(jobs, output='pdf'):
+    # jobs: records as returned by database.get_jobs
+    return write_batch(render_invoices(jobs), output)
+
+
+def write_invoice_files(jobs, directory, chunk_size=FILE_CHUNK, skip_existing=False):
+    # Writes one PDF per job into directory, named by invoice_filename. jobs
+    # can be any iterable of records, e.g. job_store.iter_jobs. Every file
+    # appears complete or not at all. Returns the number of files written.
+    os.makedirs(directory, exist_ok=True)
+    jobs = iter(jobs)
+    written = 0
+    while True:
+        chunk = list(itertools.islice(jobs, chunk_size))
+        if not chunk:
+            return written
+        if skip_existing:
+            chunk = [job for job in chunk if not os.path.exists(os.path.join(directory, invoice_filename(job)))]
+        for job, pdf in render_invoices(chunk):
+            path = os.path.join(directory, invoice_filename(job))
+            with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as out:
+                out.write(pdf)
+            os.replace(out.name, path)
+            written += 1
@@ -0,0 +1,628 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from instrumentation import connection_factory, timed
+from migrations import migrate
+
+# The job database without any Streamlit: connections, writes, filters and the
+# job records themselves. The pages use it through database.py, which adds
+# caching and shows errors; scripts and manage.py commands use it directly,
+# here errors are raised.
+
+JOB_DB = 'job_data.db'
+CATALOG_DB = 'BR_Bauhandel_Database.db'
+
+# Jobs older than the archive age live in one database per year in this
+# directory next to the job database (see archive.py). Queries attach an
+# archive only when their date filter reaches into its year; SQLite allows
+# at most 10 attached databases per connection.
+ARCHIVE_DIR = 'archive'
+ARCHIVE_FILE = re.compile(r'job_data_(\d{4})\.db$')
+MAX_ATTACHED = 10
+
+# Applied once to every new connection. WAL lets readers and the writer work at
+# the same time, NORMAL sync is safe in WAL mode and saves an fsync per commit.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",        # ~20 MB page cache per connection
+    "PRAGMA mmap_size=268435456",      # map up to 256 MB of the file
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",          # job_items are deleted together with their job
+)
+
+# sqlite3 keeps this many compiled statements per connection, as long as the
+# SQL text is identical the statement is reused instead of parsed again
+STATEMENT_CACHE_SIZE = 256
+MAX_IDLE_CONNECTIONS = 8
+
+# A writer waits up to BUSY_TIMEOUT seconds for another writer's lock, after
+# that the whole transaction is retried a few times with growing pauses
+BUSY_TIMEOUT = 10
+WRITE_ATTEMPTS = 4
+RETRY_PAUSE = 0.2
+
+# trigram indexes (job and catalog search) need words of at least 3 characters
+MIN_TRIGRAM = 3
+
+JOB_STATUSES = ('open', 'invoiced', 'paid')
+
+# item types billed as labour, every other type is material
+LABOUR_TYPES = ('work',)
+
+# iter_jobs reads this many jobs per query and holds no connection in between
+STREAM_BATCH = 500
+
+# deleted jobs can be brought back for this long (seconds), after that the
+# next delete or maintenance run removes them for good
+UNDO_SECONDS = 600
+
+# how select_jobs can order the jobs: (order within one database, order of the
+# combined rows, condition for the rows after a page_cursor)
+JOB_ORDERS = {
+    'newest': ("jobs.job_date DESC, jobs.job_id DESC", "job_date DESC, job_id DESC",
+               "(jobs.job_date, jobs.job_id) < (?, ?)"),
+    'oldest': ("jobs.job_date, jobs.job_id", "job_date, job_id", "(jobs.job_date, jobs.job_id) > (?, ?)"),
+    'rank': ("jobs_fts.rank, jobs.job_id", "search_rank, job_id", "(jobs_fts.rank, jobs.job_id) > (?, ?)"),
+}
+
+ITEM_JSON = """json_object('id', i.id, 'type', i.type, 'description', i.description,
+                              'price', i.price, 'quantity', i.quantity)"""
+
+
+class ConnectionPool:
+    # Long-lived connections to one database file. Every Streamlit rerun runs in
+    # its own thread, so a connection is checked out for the duration of a
+    # `with` block and handed back afterwards instead of being closed.
+
+    def __init__(self, path, max_idle=MAX_IDLE_CONNECTIONS):
+        self.path = path
+        self.max_idle = max_idle
+        self._idle = []
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE, factory=connection_factory())
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.pop()        # list.pop is atomic, no lock needed
+        except IndexError:
+            conn = self._connect()
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+            else:
+                conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=JOB_DB):
+    # created once per process, which is also when pending schema migrations
+    # are applied (to the job database and archives)
+    with _pools_lock:
+        if path not in _pools:
+            pool = ConnectionPool(path)
+            if path != CATALOG_DB:
+                with pool.connection() as conn:
+                    migrate(conn)
+            _pools[path] = pool
+        return _pools[path]
+
+
+def connect(path=JOB_DB):
+    # usage: with connect() as conn: ...
+    return get_pool(path).connection()
+
+
+def _is_locked(error):
+    return isinstance(error, sqlite3.OperationalError) and 'locked' in str(error)
+
+
+def write(work, path=JOB_DB):
+    # Runs work(conn) in one write transaction and returns its result, writes
+    # to the job database or an archive bump the data version. BEGIN
+    # IMMEDIATE takes the write lock up front, so two writers queue on the busy
+    # timeout instead of failing half-way when a read lock can't be upgraded.
+    for attempt in range(WRITE_ATTEMPTS):
+        try:
+            with connect(path) as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                result = work(conn)
+                conn.commit()
+            if path != CATALOG_DB:
+                DATA_VERSION.bump()
+            return result
+        except sqlite3.OperationalError as e:
+            if not _is_locked(e) or attempt == WRITE_ATTEMPTS - 1:
+                raise
+            time.sleep(RETRY_PAUSE * 2 ** attempt)
+
+
+def allocate_id(conn, name):
+    # next number of a named counter, only unique within a write transaction
+    return conn.execute("""INSERT INTO id_counters (name, value) VALUES (?, 1)
+                           ON CONFLICT (name) DO UPDATE SET value = value + 1
+                           RETURNING value""", (name,)).fetchone()[0]
+
+
+def new_job_id(conn):
+    # readable timestamp plus a counter, unique even for saves in the same second
+    return f"{datetime.now():%Y%m%d_%H%M%S}_{allocate_id(conn, 'job'):05d}"
+
+
+class DataVersion:
+    # counter of committed writes to the job database in this process; the
+    # script threads of several sessions bump it at once, an increment lost
+    # between them would leave the cached pages stale
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self.value += 1
+
+
+DATA_VERSION = DataVersion()
+
+
+def data_version():
+    return DATA_VERSION.value
+
+
+# the pages cache query results under the data version, so writes made here
+# show at once; the TTL (seconds) bounds how long a change made by another
+# process can go unnoticed
+QUERY_CACHE_TTL = 300
+
+
+# triggers that index or summarize one new row at a time, deferred_search_index
+# and deferred_summaries replace them with one statement per table for a bulk load
+SEARCH_INSERT_TRIGGERS = ('job_search_insert', 'job_search_jobs_insert', 'job_search_items_insert')
+SUMMARY_INSERT_TRIGGERS = ('summary_jobs_insert', 'summary_items_insert')
+DELETE_TRIGGERS = ('summary_jobs_delete', 'summary_items_delete', 'job_search_jobs_delete', 'job_search_items_delete',
+                   'job_search_delete')
+
+# FTS5 merges its index segments while documents are added. A bulk load turns
+# that off and writes large segments, afterwards the defaults apply again and
+# later saves merge the segments bit by bit.
+FTS_BULK_SETTINGS = {'automerge': 0, 'crisismerge': 1000}
+FTS_DEFAULT_SETTINGS = {'automerge': 4, 'crisismerge': 16}
+
+
+@contextmanager
+def _triggers_dropped(conn, names, schema='main'):
+    # inside the caller's transaction, a rollback brings them back as well;
+    # SQLite stores a trigger's SQL without the schema it was created in
+    triggers = conn.execute(f"SELECT name, sql FROM {schema}.sqlite_master WHERE type = 'trigger' AND name IN "
+                            f"({', '.join('?' * len(names))})", names).fetchall()
+    for name, _ in triggers:
+        conn.execute(f"DROP TRIGGER {schema}.{name}")
+    yield
+    for name, sql in triggers:
+        conn.execute(sql.replace(f"CREATE TRIGGER {name}", f"CREATE TRIGGER {schema}.{name}", 1))
+
+
+@contextmanager
+def deferred_search_index(conn):
+    # For bulk inserts of new jobs inside the caller's transaction. FTS5 writes
+    # out its pending index data every time a trigger touches it, and every
+    # item would rewrite its job's search document, so loading thousands of
+    # jobs row by row gets slower with every row. The insert triggers are
+    # dropped meanwhile; the documents of the new jobs are built and indexed
+    # in one statement each at the end. Existing jobs must not be changed
+    # inside the block, their index entries wouldn't follow.
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM jobs").fetchone()[0]
+    with _triggers_dropped(conn, SEARCH_INSERT_TRIGGERS):
+        yield
+        for setting, value in FTS_BULK_SETTINGS.items():
+            conn.execute("INSERT INTO jobs_fts (jobs_fts, rank) VALUES (?, ?)", (setting, value))
+        conn.execute("""INSERT INTO job_search (id, job_id, client_name, client_address, job_notes, items)
+                        SELECT id, job_id, client_name, client_address, job_notes,
+                               (SELECT group_concat(description, ' ') FROM job_items WHERE job_id = jobs.job_id)
+                        FROM jobs WHERE id > ?""", (last_id,))
+        conn.execute("""INSERT INTO jobs_fts (rowid, job_id, client_name, client_address, job_notes, items)
+                        SELECT id, job_id, client_name, client_address, job_notes, items FROM job_search WHERE id > ?""",
+                     (last_id,))
+        for setting, value in FTS_DEFAULT_SETTINGS.items():
+            conn.execute("INSERT INTO jobs_fts (jobs_fts, rank) VALUES (?, ?)", (setting, value))
+
+
+@contextmanager
+def deferred_summaries(conn):
+    # Companion of deferred_search_index: the summary tables get the new jobs
+    # and items added in one grouped statement each instead of one upsert per
+    # row. Inserts only, deletes and updates inside the block would still be
+    # summarized by their own triggers.
+    last_job, last_item = conn.execute("SELECT (SELECT COALESCE(MAX(id), 0) FROM jobs), "
+                                       "(SELECT COALESCE(MAX(id), 0) FROM job_items)").fetchone()
+    with _triggers_dropped(conn, SUMMARY_INSERT_TRIGGERS):
+        yield
+        conn.execute("""INSERT INTO summary_revenue (day, client_name, status, jobs, total)
+                        SELECT COALESCE(job_date, ''), COALESCE(client_name, ''), status, COUNT(*), SUM(COALESCE(total_amount, 0))
+                        FROM jobs WHERE id > ? GROUP BY 1, 2, 3
+                        ON CONFLICT (day, client_name, status) DO UPDATE
+                        SET jobs = jobs + excluded.jobs, total = total + excluded.total""", (last_job,))
+        conn.execute("""INSERT INTO summary_item_types (day, type, items, amount)
+                        SELECT COALESCE(j.job_date, ''), COALESCE(i.type, ''), COUNT(*), SUM(COALESCE(i.price * i.quantity, 0))
+                        FROM job_items i JOIN jobs j ON j.job_id = i.job_id WHERE i.id > ? GROUP BY 1, 2
+                        ON CONFLICT (day, type) DO UPDATE
+                        SET items = items + excluded.items, amount = amount + excluded.amount""", (last_item,))
+        conn.execute("""INSERT INTO summary_articles (article_nr, description, items, quantity, amount)
+                        SELECT article_nr, COALESCE(description, ''), COUNT(*), SUM(COALESCE(quantity, 0)),
+                               SUM(COALESCE(price * quantity, 0))
+                        FROM job_items WHERE id > ? AND type = 'catalog' AND article_nr IS NOT NULL GROUP BY 1, 2
+                        ON CONFLICT (article_nr, description) DO UPDATE
+                        SET items = items + excluded.items, quantity = quantity + excluded.quantity,
+                            amount = amount + excluded.amount""", (last_item,))
+
+
+def bulk_delete_jobs(conn, where, params=(), schema='main'):
+    # Deletes the jobs matching `where` (a condition on jobs) with their items
+    # inside the caller's transaction and returns their number. The delete
+    # triggers would update the summaries, the search documents and the index
+    # once per job and item; here each of them is one statement for all jobs.
+    # Jobs marked as deleted are already out of the summaries. schema is the
+    # job database or archive attached to conn that the jobs are deleted from.
+    conn.execute("DROP TABLE IF EXISTS temp.deleted_jobs")
+    conn.execute(f"CREATE TEMP TABLE deleted_jobs AS SELECT id, job_id FROM {schema}.jobs WHERE {where}", params)
+    conn.execute("CREATE INDEX temp.idx_deleted_jobs_job_id ON deleted_jobs (job_id)")
+    with _triggers_dropped(conn, DELETE_TRIGGERS, schema):
+        conn.execute(f"""INSERT INTO {schema}.summary_revenue (day, client_name, status, jobs, total)
+                        SELECT COALESCE(job_date, ''), COALESCE(client_name, ''), status, -COUNT(*), -SUM(COALESCE(total_amount, 0))
+                        FROM {schema}.jobs WHERE id IN (SELECT id FROM temp.deleted_jobs) AND deleted_at IS NULL
+                        GROUP BY 1, 2, 3
+                        ON CONFLICT (day, client_name, status) DO UPDATE
+                        SET jobs = jobs + excluded.jobs, total = total + excluded.total""")
+        conn.execute(f"""INSERT INTO {schema}.summary_item_types (day, type, items, amount)
+                        SELECT COALESCE(j.job_date, ''), COALESCE(i.type, ''), -COUNT(*), -SUM(COALESCE(i.price * i.quantity, 0))
+                        FROM temp.deleted_jobs d JOIN {schema}.jobs j ON j.id = d.id
+                        JOIN {schema}.job_items i ON i.job_id = d.job_id
+                        WHERE j.deleted_at IS NULL GROUP BY 1, 2
+                        ON CONFLICT (day, type) DO UPDATE
+                        SET items = items + excluded.items, amount = amount + excluded.amount""")
+        conn.execute(f"""INSERT INTO {schema}.summary_articles (article_nr, description, items, quantity, amount)
+                        SELECT i.article_nr, COALESCE(i.description, ''), -COUNT(*), -SUM(COALESCE(i.quantity, 0)),
+                               -SUM(COALESCE(i.price * i.quantity, 0))
+                        FROM temp.deleted_jobs d JOIN {schema}.jobs j ON j.id = d.id
+                        JOIN {schema}.job_items i ON i.job_id = d.job_id
+                        WHERE j.deleted_at IS NULL AND i.type = 'catalog' AND i.article_nr IS NOT NULL GROUP BY 1, 2
+                        ON CONFLICT (article_nr, description) DO UPDATE
+                        SET items = items + excluded.items, quantity = quantity + excluded.quantity,
+                            amount = amount + excluded.amount""")
+        conn.execute(f"DELETE FROM {schema}.summary_revenue WHERE jobs = 0")
+        conn.execute(f"DELETE FROM {schema}.summary_item_types WHERE items = 0")
+        conn.execute(f"DELETE FROM {schema}.summary_articles WHERE items = 0")
+
+        for setting, value in FTS_BULK_SETTINGS.items():
+            conn.execute(f"INSERT INTO {schema}.jobs_fts (jobs_fts, rank) VALUES (?, ?)", (setting, value))
+        conn.execute(f"""INSERT INTO {schema}.jobs_fts (jobs_fts, rowid, job_id, client_name, client_address, job_notes, items)
+                        SELECT 'delete', id, job_id, client_name, client_address, job_notes, items
+                        FROM {schema}.job_search WHERE id IN (SELECT id FROM temp.deleted_jobs)""")
+        for setting, value in FTS_DEFAULT_SETTINGS.items():
+            conn.execute(f"INSERT INTO {schema}.jobs_fts (jobs_fts, rank) VALUES (?, ?)", (setting, value))
+        conn.execute(f"DELETE FROM {schema}.job_search WHERE id IN (SELECT id FROM temp.deleted_jobs)")
+        conn.execute(f"DELETE FROM {schema}.job_items WHERE job_id IN (SELECT job_id FROM temp.deleted_jobs)")
+        deleted = conn.execute(f"DELETE FROM {schema}.jobs WHERE id IN (SELECT id FROM temp.deleted_jobs)").rowcount
+    conn.execute("DROP TABLE temp.deleted_jobs")
+    return deleted
+
+
+def purge_deleted_jobs(conn, older_than=UNDO_SECONDS):
+    # Removes the jobs marked as deleted more than older_than seconds ago for
+    # good, inside the caller's transaction; returns their number. Looked up
+    # first since bulk_delete_jobs recreates its triggers even for no jobs.
+    cutoff = f"-{older_than} seconds"
+    if not conn.execute("SELECT 1 FROM jobs WHERE deleted_at < datetime('now', 'localtime', ?) LIMIT 1",
+                        (cutoff,)).fetchone():
+        return 0
+    return bulk_delete_jobs(conn, "deleted_at < datetime('now', 'localtime', ?)", (cutoff,))
+
+
+def match_expression(term):
+    # FTS5 query for a search term: every word becomes a quoted phrase, FTS5
+    # ANDs them. A word shorter than a trigram can't be looked up on its own,
+    # it stays in one phrase with its neighbour ("Client 3"); what is still
+    # too short is left out.
+    phrases = []
+    for word in term.split():
+        if phrases and (len(word) < MIN_TRIGRAM or len(phrases[-1]) < MIN_TRIGRAM):
+            phrases[-1] += " " + word
+        else:
+            phrases.append(word)
+    return " ".join('"' + p.replace('"', '""') + '"' for p in phrases if len(p) >= MIN_TRIGRAM)
+
+
+def job_filters(date_from=None, date_to=None, search_term=None, client=None, status=None, schema='main'):
+    # Returns the FROM clause, the WHERE clause, its parameters and whether
+    # the jobs can be ranked by relevance, for the jobs of one database (main
+    # or an attached archive). A search goes through the jobs_fts index
+    # (client, address, notes, job id and item descriptions); only a term too
+    # short for trigrams falls back to LIKE. client is an exact client name.
+    source = f"{schema}.jobs AS jobs"
+    where = "WHERE jobs.deleted_at IS NULL"
+    params = []
+
+    match = match_expression(search_term or '')
+    if match:
+        source += f" JOIN {schema}.jobs_fts AS jobs_fts ON jobs_fts.rowid = jobs.id"
+        where += " AND jobs_fts MATCH ?"
+        params.append(match)
+    elif search_term:
+        where += " AND (jobs.client_name LIKE ? OR jobs.job_id LIKE ?)"
+        params.extend([f"%{search_term}%", f"%{search_term}%"])
+    if client:
+        where += " AND jobs.client_name = ? COLLATE NOCASE"
+        params.append(client)
+    if status:
+        where += " AND jobs.status = ?"
+        params.append(status)
+    if date_from:
+        where += " AND jobs.job_date >= ?"
+        params.append(date_from)
+    if date_to:
+        where += " AND jobs.job_date <= ?"
+        params.append(date_to)
+
+    return source, where, params, bool(match)
+
+
+def archive_path(year, database=JOB_DB):
+    return os.path.join(os.path.dirname(database), ARCHIVE_DIR, f"job_data_{year}.db")
+
+
+def archive_years(database=JOB_DB):
+    try:
+        names = os.listdir(os.path.join(os.path.dirname(database), ARCHIVE_DIR))
+    except FileNotFoundError:
+        return []
+    return sorted(int(match.group(1)) for match in map(ARCHIVE_FILE.match, names) if match)
+
+
+def archives_for(date_from=None, date_to=None, database=JOB_DB):
+    # the archive years a date range reaches into, all of them without a range
+    return [year for year in archive_years(database)
+            if (not date_from or year >= int(date_from[:4])) and (not date_to or year <= int(date_to[:4]))]
+
+
+def job_databases(database=JOB_DB):
+    # the job database and all its archives, for changes to jobs known by id only
+    return [database] + [archive_path(year, database) for year in archive_years(database)]
+
+
+def attach_archives(conn, years, database=JOB_DB):
+    # Attaches the archives of years to conn and returns the schemas to query,
+    # main first. An archive stays attached to a pooled connection until the
+    # limit makes room for others, so the statement cache isn't thrown away
+    # by an ATTACH on every query.
+    wanted = [f"archive_{year}" for year in years]
+    if len(wanted) > MAX_ATTACHED:
+        raise ValueError(f"The dates reach into {len(wanted)} yearly archives, at most {MAX_ATTACHED} "
+                         f"can be read at once. Narrow the date range.")
+    attached = [row[1] for row in conn.execute("PRAGMA database_list") if row[1].startswith('archive_')]
+    missing = [schema for schema in wanted if schema not in attached]
+    for schema in [schema for schema in attached if schema not in wanted]:
+        if len(attached) + len(missing) <= MAX_ATTACHED:
+            break
+        conn.execute(f"DETACH DATABASE {schema}")
+        attached.remove(schema)
+    for year, schema in zip(years, wanted):
+        if schema in missing:
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (archive_path(year, database),))
+    return ['main'] + wanted
+
+
+def archive_batches(conn, years, database=JOB_DB):
+    # Yields the schemas to query for any number of archive years, attached
+    # MAX_ATTACHED at a time; main comes with the first batch only. For
+    # lookups over every archive, the caller combines the batches' results.
+    years = list(years)
+    for start in range(0, max(len(years), 1), MAX_ATTACHED):
+        schemas = attach_archives(conn, years[start:start + MAX_ATTACHED], database)
+        yield schemas if start == 0 else schemas[1:]
+
+
+def select_jobs(schemas, filters, order, after=None, limit=None):
+    # Query and parameters for the jobs matching filters (the arguments of
+    # job_filters) in the databases of schemas, in one of JOB_ORDERS and
+    # starting after the page_cursor `after`. With archives every database
+    # returns its first `limit` rows along its own index and only those are
+    # ordered once more; search ranks come from each database's own index.
+    inner, outer, keyset = JOB_ORDERS[order]
+    columns = "jobs.*, jobs_fts.rank AS search_rank" if order == 'rank' else "jobs.*"
+    arms, params = [], []
+    for schema in schemas:
+        source, where, arm_params, _ = job_filters(*filters, schema=schema)
+        if after:
+            where += f" AND {keyset}"
+            arm_params.extend(after)
+        arm = f"SELECT {columns} FROM {source} {where} ORDER BY {inner}"
+        if limit:
+            arm += " LIMIT ?"
+            arm_params.append(limit)
+        arms.append(arm)
+        params.extend(arm_params)
+
+    if len(arms) == 1:
+        return arms[0], params
+    query = " UNION ALL ".join(f"SELECT * FROM ({arm})" for arm in arms) + f" ORDER BY {outer}"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    return query, params
+
+
+def count_jobs_query(schemas, filters):
+    arms, params = [], []
+    for schema in schemas:
+        source, where, arm_params, _ = job_filters(*filters, schema=schema)
+        arms.append(f"SELECT COUNT(*) AS jobs FROM {source} {where}")
+        params.extend(arm_params)
+    return f"SELECT SUM(jobs) FROM ({' UNION ALL '.join(arms)})", params
+
+
+def items_json(schemas, job='j'):
+    # the items of the job aliased `job` as one JSON array, looked up by
+    # job_id in every database of schemas (a job is only ever in one)
+    lookups = " UNION ALL ".join(f"SELECT * FROM {schema}.job_items WHERE job_id = {job}.job_id" for schema in schemas)
+    return f"(SELECT json_group_array({ITEM_JSON}) FROM ({lookups}) i)"
+
+
+def _job_records(conn, query, params):
+    cursor = conn.execute(query, params)
+    columns = [column[0] for column in cursor.description]
+    for row in cursor:
+        job = dict(zip(columns, row))
+        job['items'] = json.loads(job['items'])
+        yield job
+
+
+def iter_jobs(date_from=None, date_to=None, search_term=None, client=None, status=None, batch_size=STREAM_BATCH):
+    # Yields the matching jobs oldest first as dicts with the columns of jobs
+    # and their list of items, the same records the pages pass to invoicing.
+    # They are read batch by batch along idx_jobs_date_job_id, so any number
+    # of jobs streams through in constant memory.
+    filters = (date_from, date_to, search_term, client, status)
+    after = None
+    while True:
+        with connect() as conn:
+            schemas = attach_archives(conn, archives_for(date_from, date_to))
+            query, params = select_jobs(schemas, filters, 'oldest', after, batch_size)
+            batch = list(_job_records(conn, f"SELECT j.*, {items_json(schemas)} AS items FROM ({query}) j "
+                                            f"ORDER BY {JOB_ORDERS['oldest'][1]}", params))
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        after = (batch[-1]['job_date'], batch[-1]['job_id'])
+
+
+def get_job_items(conn, job_id, schema='main'):
+    return conn.execute(f"SELECT * FROM {schema}.job_items WHERE job_id = ?", (job_id,)).fetchall()
+
+
+@timed('get_job_details')
+def get_job_details(job_id):
+    # the jobs row and its items, from the job database or an archive
+    with connect() as conn:
+        for schema in (schema for schemas in archive_batches(conn, archives_for()) for schema in schemas):
+            job = conn.execute(f"SELECT * FROM {schema}.jobs WHERE job_id = ? AND deleted_at IS NULL",
+                               (job_id,)).fetchone()
+            if job:
+                return job, get_job_items(conn, job_id, schema)
+    return None, []
+
+
+@timed('save_job')
+def save_job(job_data, items_data):
+    # Saves the job and its items in one transaction. The job_id is allocated
+    # inside it unless job_data already has one; returns the job_id.
+    def save(conn):
+        job_id = job_data.get('job_id') or new_job_id(conn)
+        conn.execute("INSERT INTO jobs (job_id, client_name, client_address, job_date, job_notes, total_amount, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (job_id, job_data['client_name'], job_data['client_address'], job_data['job_date'], job_data['job_notes'], job_data['total_amount'], job_data['timestamp']))
+        conn.executemany("INSERT INTO job_items (job_id, type, description, price, quantity, article_nr) VALUES (?, ?, ?, ?, ?, ?)",
+                         [(job_id, item['type'], item['description'], item['price'], item['quantity'], item.get('article_nr')) for item in items_data])
+        return job_id
+
+    return write(save)
+
+
+@timed('delete_job')
+def delete_job(job_id):
+    # True if the job existed; like every deleted job it can be restored
+    # for UNDO_SECONDS
+    return delete_jobs([job_id]) > 0
+
+
+@timed('delete_jobs')
+def delete_jobs(job_ids):
+    # Marks the jobs as deleted, in one transaction per database (the job
+    # database, archives) that has any of them. They are gone from every
+    # list, search and summary at once; restore_deleted_jobs brings them back
+    # until they are purged, here or by maintenance, UNDO_SECONDS later.
+    # Returns the number of jobs deleted.
+    job_ids = json.dumps(list(job_ids))
+
+    def delete(conn):
+        purge_deleted_jobs(conn)
+        return conn.execute("""UPDATE jobs SET deleted_at = datetime('now', 'localtime')
+                               WHERE job_id IN (SELECT value FROM json_each(?)) AND deleted_at IS NULL""",
+                            (job_ids,)).rowcount
+
+    return sum(write(delete, path) for path in job_databases())
+
+
+@timed('restore_deleted_jobs')
+def restore_deleted_jobs(job_ids):
+    # undoes delete_jobs for the jobs not purged yet, returns their number
+    job_ids = json.dumps(list(job_ids))
+    return sum(write(lambda conn: conn.execute(
+        "UPDATE jobs SET deleted_at = NULL WHERE job_id IN (SELECT value FROM json_each(?)) AND deleted_at IS NOT NULL",
+        (job_ids,)).rowcount, path) for path in job_databases())
+
+
+@timed('update_jobs')
+def update_jobs(job_ids, job_date=None, status=None):
+    # Sets the date and/or the status of the jobs, in one transaction per
+    # database that has any of them. Returns the (job_id, job_date, status)
+    # rows from before, for restore_jobs. An archived job keeps a date in its
+    # archive's year, the pages only look for it there by its date.
+    if status is not None and status not in JOB_STATUSES:
+        raise ValueError(f"Unknown job status '{status}', expected one of {', '.join(JOB_STATUSES)}")
+    job_ids = json.dumps(list(job_ids))
+    selected = "job_id IN (SELECT value FROM json_each(?)) AND deleted_at IS NULL"
+    paths = job_databases()
+    for path in paths[1:] if job_date else []:
+        year = ARCHIVE_FILE.search(path).group(1)
+        if not job_date.startswith(year):
+            with connect(path) as conn:
+                if conn.execute(f"SELECT 1 FROM jobs WHERE {selected} LIMIT 1", (job_ids,)).fetchone():
+                    raise ValueError(f"Archived jobs of {year} can only get a date in {year}")
+
+    def update(conn):
+        previous = conn.execute(f"SELECT job_id, job_date, status FROM jobs WHERE {selected}", (job_ids,)).fetchall()
+        conn.execute(f"UPDATE jobs SET job_date = COALESCE(?, job_date), status = COALESCE(?, status) WHERE {selected}",
+                     (job_date, status, job_ids))
+        return [tuple(row) for row in previous]
+
+    return [row for path in paths for row in write(update, path)]
+
+
+@timed('restore_jobs')
+def restore_jobs(previous):
+    # undoes update_jobs with the rows it returned
+    rows = [(job_date, status, job_id) for job_id, job_date, status in previous]
+    return sum(write(lambda conn: conn.executemany(
+        "UPDATE jobs SET job_date = ?, status = ? WHERE job_id = ? AND deleted_at IS NULL", rows).rowcount, path)
+        for path in job_databases())
+
+
+@timed('set_job_status')
+def set_job_status(job_ids, status):
+    # returns the number of jobs changed, archived jobs included
+    if status not in JOB_STATUSES:
+        raise ValueError(f"Unknown job status '{status}', expected one of {', '.join(JOB_STATUSES)}")
+    job_ids = json.dumps(list(job_ids))
+    return sum(write(lambda conn: conn.execute(
+        "UPDATE jobs SET status = ? WHERE job_id IN (SELECT value FROM json_each(?)) AND status IS NOT ? "
+        "AND deleted_at IS NULL",
+        (status, job_ids, status)).rowcount, path) for path in job_databases())
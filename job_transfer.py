@@ -0,0 +1,232 @@
+import csv
+import itertools
+import os
+import sqlite3
+from job_store import (JOB_STATUSES, archives_for, attach_archives, deferred_search_index, deferred_summaries,
+                       job_filters, select_jobs)
+from migrations import migrate
+
+# Bulk import and export of jobs with their items, as CSV or Parquet. Jobs and
+# items are two files linked by job_id, the same layout in both directions.
+# An import streams both files in chunks into staging tables and then adds
+# the new jobs in one transaction with the search index built once at the
+# end; an export streams the rows straight from SQLite into the files.
+
+JOB_COLUMNS = ['job_id', 'client_name', 'client_address', 'job_date', 'job_notes', 'total_amount', 'timestamp', 'status']
+ITEM_COLUMNS = ['job_id', 'type', 'description', 'price', 'quantity', 'article_nr']
+REQUIRED_JOB_COLUMNS = ['job_id', 'client_name', 'job_date']
+REQUIRED_ITEM_COLUMNS = ['job_id', 'type', 'description', 'price', 'quantity']
+NUMERIC = {'total_amount', 'price', 'quantity'}
+CHUNK_SIZE = 50000
+BULK_CACHE_SIZE = -262144      # ~256 MB page cache, a big import touches many pages in one transaction
+
+PARQUET_SUFFIXES = ('.parquet', '.pq')
+
+
+def _number(value):
+    # spreadsheets write 1'250.50 or 12,5 as often as 12.5
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(str(value).replace("'", "").replace(",", "."))
+
+
+def _text(value):
+    if value is None:
+        return None
+    value = value.strip()
+    return value or None
+
+
+def _positions(path, header, columns, required):
+    missing = [col for col in required if col not in header]
+    if missing:
+        raise ValueError(f"{os.path.basename(path)} is missing the columns: {', '.join(missing)}")
+    return [header.index(col) if col in header else None for col in columns]
+
+
+def _csv_rows(path, columns, required, encoding, delimiter):
+    with open(path, newline='', encoding=encoding) as f:
+        if delimiter is None:
+            delimiter = csv.Sniffer().sniff(f.read(65536), delimiters=';,\t').delimiter
+            f.seek(0)
+        reader = csv.reader(f, delimiter=delimiter)
+        positions = _positions(path, [name.strip() for name in next(reader, [])], columns, required)
+        convert = [_number if col in NUMERIC else _text for col in columns]
+        for record in reader:
+            if not any(record):
+                continue
+            yield tuple(f(record[pos]) if pos is not None and pos < len(record) else None
+                        for f, pos in zip(convert, positions))
+
+
+def _parquet_rows(path, columns, required):
+    # Read batch by batch, a Parquet file is never loaded as a whole. The
+    # columns are cast by pyarrow, so the values need no conversion here.
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    parquet = pq.ParquetFile(path)
+    present = [col for col in columns if col in parquet.schema_arrow.names]
+    _positions(path, present, columns, required)
+    for batch in parquet.iter_batches(batch_size=CHUNK_SIZE, columns=present):
+        values = []
+        for col in columns:
+            if col not in present:
+                values.append(itertools.repeat(None, batch.num_rows))
+                continue
+            column = batch.column(present.index(col))
+            if col in NUMERIC:
+                values.append(pc.cast(column, pa.float64()).to_pylist())
+            else:
+                values.append(pc.utf8_trim_whitespace(pc.cast(column, pa.string())).to_pylist())
+        yield from zip(*values)
+
+
+def read_rows(path, columns, required, encoding='utf-8-sig', delimiter=None):
+    # yields one tuple per row in the order of columns, missing optional
+    # columns are None
+    if os.path.splitext(path)[1].lower() in PARQUET_SUFFIXES:
+        return _parquet_rows(path, columns, required)
+    return _csv_rows(path, columns, required, encoding, delimiter)
+
+
+def _stage(conn, table, columns, rows):
+    conn.execute(f"DROP TABLE IF EXISTS temp.{table}")
+    conn.execute(f"CREATE TEMP TABLE {table} ({', '.join(columns)})")
+    insert = f"INSERT INTO temp.{table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    rows = iter(rows)
+    staged = 0
+    while True:
+        chunk = list(itertools.islice(rows, CHUNK_SIZE))
+        if not chunk:
+            return staged
+        conn.executemany(insert, chunk)
+        staged += len(chunk)
+
+
+def _check_staged(conn):
+    # the whole file is rejected before anything is written
+    problems = {
+        "jobs without job_id or client_name": "SELECT COUNT(*) FROM temp.import_jobs WHERE job_id IS NULL OR client_name IS NULL",
+        "job dates that aren't YYYY-MM-DD": "SELECT COUNT(*) FROM temp.import_jobs WHERE date(job_date) IS NOT job_date",
+        "job_ids that appear more than once": "SELECT COUNT(*) - COUNT(DISTINCT job_id) FROM temp.import_jobs",
+        f"statuses other than {', '.join(JOB_STATUSES)}":
+            f"SELECT COUNT(*) FROM temp.import_jobs WHERE status NOT IN ({', '.join('?' * len(JOB_STATUSES))})",
+        "items without price or quantity": "SELECT COUNT(*) FROM temp.import_items WHERE price IS NULL OR quantity IS NULL",
+    }
+    for problem, query in problems.items():
+        count = conn.execute(query, JOB_STATUSES if '?' in query else ()).fetchone()[0]
+        if count:
+            raise ValueError(f"{count} {problem}, nothing imported")
+
+
+def import_jobs(database, jobs_path, items_path=None, encoding='utf-8-sig', delimiter=None):
+    # Adds the jobs of the files to the job database. Jobs whose job_id is
+    # already there are skipped together with their items, items of jobs that
+    # aren't in the jobs file are ignored. A missing total is the sum of the
+    # job's items. Returns the number of rows read, imported and skipped.
+    conn = sqlite3.connect(database, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA cache_size={BULK_CACHE_SIZE}")
+        migrate(conn)
+        read_jobs = _stage(conn, 'import_jobs', JOB_COLUMNS,
+                           read_rows(jobs_path, JOB_COLUMNS, REQUIRED_JOB_COLUMNS, encoding, delimiter))
+        read_items = _stage(conn, 'import_items', ITEM_COLUMNS,
+                            read_rows(items_path, ITEM_COLUMNS, REQUIRED_ITEM_COLUMNS, encoding, delimiter)
+                            if items_path else ())
+        conn.execute("CREATE INDEX temp.idx_import_items_job_id ON import_items (job_id)")
+        _check_staged(conn)
+        conn.commit()
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM temp.import_jobs WHERE job_id IN (SELECT job_id FROM jobs)")
+            with deferred_search_index(conn), deferred_summaries(conn):
+                conn.execute("""INSERT INTO jobs (job_id, client_name, client_address, job_date, job_notes,
+                                                  total_amount, timestamp, status)
+                                SELECT s.job_id, s.client_name, COALESCE(s.client_address, ''), s.job_date,
+                                       COALESCE(s.job_notes, ''),
+                                       COALESCE(s.total_amount, (SELECT ROUND(SUM(i.price * i.quantity), 2)
+                                                                 FROM temp.import_items i WHERE i.job_id = s.job_id), 0),
+                                       COALESCE(s.timestamp, datetime('now', 'localtime')), COALESCE(s.status, 'open')
+                                FROM temp.import_jobs s ORDER BY s.job_date, s.job_id""")
+                jobs = conn.execute("SELECT changes()").fetchone()[0]
+                conn.execute("""INSERT INTO job_items (job_id, type, description, price, quantity, article_nr)
+                                SELECT i.job_id, i.type, i.description, i.price, i.quantity, i.article_nr
+                                FROM temp.import_items i JOIN temp.import_jobs s ON s.job_id = i.job_id
+                                ORDER BY i.rowid""")
+                items = conn.execute("SELECT changes()").fetchone()[0]
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        conn.execute("DROP TABLE temp.import_jobs")
+        conn.execute("DROP TABLE temp.import_items")
+        conn.execute("PRAGMA optimize")
+        return {'read_jobs': read_jobs, 'read_items': read_items, 'jobs': jobs, 'items': items,
+                'skipped': read_jobs - jobs}
+    finally:
+        conn.close()
+
+
+def _parquet_schema(columns):
+    import pyarrow as pa
+    return pa.schema([(col, pa.float64() if col in NUMERIC else pa.string()) for col in columns])
+
+
+def write_rows(path, columns, cursor, delimiter=','):
+    # Writes the rows of cursor chunk by chunk, returns the number of rows
+    if os.path.splitext(path)[1].lower() in PARQUET_SUFFIXES:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = _parquet_schema(columns)
+        written = 0
+        with pq.ParquetWriter(path, schema) as writer:
+            while rows := cursor.fetchmany(CHUNK_SIZE):
+                writer.write_batch(pa.record_batch(list(zip(*rows)), schema=schema))
+                written += len(rows)
+        return written
+
+    written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter=delimiter)
+        writer.writerow(columns)
+        while rows := cursor.fetchmany(CHUNK_SIZE):
+            writer.writerows(rows)
+            written += len(rows)
+    return written
+
+
+def export_jobs(database, jobs_path, items_path=None, date_from=None, date_to=None, search_term=None,
+                client=None, status=None, delimiter=','):
+    # Writes the matching jobs oldest first, and their items, with the same
+    # filters as the job list; archived jobs are included when the dates reach
+    # back to them. Both files are read from one snapshot of the database.
+    # Returns the number of jobs and items written.
+    filters = (date_from, date_to, search_term, client, status)
+    conn = sqlite3.connect(database, timeout=30)
+    try:
+        schemas = attach_archives(conn, archives_for(date_from, date_to, database), database)
+        conn.execute("BEGIN")
+        query, params = select_jobs(schemas, filters, 'oldest')
+        jobs = write_rows(jobs_path, JOB_COLUMNS, conn.execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM ({query}) ORDER BY job_date, job_id", params), delimiter)
+        items = 0
+        if items_path:
+            arms, params = [], []
+            for schema in schemas:
+                source, where, arm_params, _ = job_filters(*filters, schema=schema)
+                arms.append(f"""SELECT {', '.join(f'i.{col}' for col in ITEM_COLUMNS)}, jobs.job_date, i.id
+                                FROM {source} JOIN {schema}.job_items i ON i.job_id = jobs.job_id {where}""")
+                params.extend(arm_params)
+            items = write_rows(items_path, ITEM_COLUMNS, conn.execute(
+                f"SELECT {', '.join(ITEM_COLUMNS)} FROM ({' UNION ALL '.join(arms)}) ORDER BY job_date, job_id, id",
+                params), delimiter)
+        conn.rollback()
+        return {'jobs': jobs, 'items': items}
+    finally:
+        conn.close()
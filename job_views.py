@@ -0,0 +1,186 @@
+import time
+import streamlit as st
+from database import (count_jobs, get_jobs, page_cursor, delete_jobs, restore_deleted_jobs, update_jobs,
+                      restore_jobs)
+from job_store import UNDO_SECONDS
+
+# Shared by the Job List and the Invoice page
+
+PAGE_SIZES = [25, 50, 100, 200]
+TABLE_COLUMNS = ['job_id', 'job_date', 'client_name', 'total_amount']
+
+# the last delete or bulk change of the session, shown with an Undo button
+# for UNDO_SECONDS
+UNDO_KEY = "bulk_undo"
+
+
+def job_filters():
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        date_from = st.date_input("From Date", key="date_from")
+    with col2:
+        date_to = st.date_input("To Date", key="date_to")
+    with col3:
+        search = st.text_input("Search (Client, Job ID, Notes or Material)", key="search")
+
+    return date_from.strftime('%Y-%m-%d'), date_to.strftime('%Y-%m-%d'), search
+
+
+def _clear_table_selection(key):
+    # the table keeps its selected row positions when other jobs are shown
+    # in it, they would point at jobs nobody picked
+    st.session_state.pop(f"{key}_table", None)
+
+
+def _next_page(key, cursor):
+    st.session_state[f"{key}_cursors"].append(cursor)
+    _clear_table_selection(key)
+
+
+def _previous_page(key):
+    st.session_state[f"{key}_cursors"].pop()
+    _clear_table_selection(key)
+
+
+def job_page(key, filters):
+    # Loads the current page of jobs for the filters and shows the page
+    # controls. Only the start cursor of every visited page is kept in the
+    # session, going back is just dropping the last one.
+    col1, col2 = st.columns(2)
+    with col1:
+        page_size = st.selectbox("Jobs per page", PAGE_SIZES, key=f"{key}_page_size")
+    with col2:
+        compact = st.toggle("Compact table", key=f"{key}_compact")
+
+    # new filters start again at the first page
+    signature = (filters, page_size)
+    if st.session_state.get(f"{key}_signature") != signature:
+        st.session_state[f"{key}_signature"] = signature
+        st.session_state[f"{key}_cursors"] = [None]
+        _clear_table_selection(key)
+    cursors = st.session_state[f"{key}_cursors"]
+
+    total = count_jobs(*filters)
+    jobs = get_jobs(*filters, limit=page_size, after=cursors[-1])
+
+    page = len(cursors)
+    pages = max(1, -(-total // page_size))
+    has_next = page < pages and not jobs.empty
+
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        st.caption(f"Page {page} of {pages} · {total} jobs")
+    with col2:
+        st.button("Previous", key=f"{key}_previous", disabled=page == 1,
+                  on_click=_previous_page, args=(key,))
+    with col3:
+        cursor = page_cursor(jobs) if has_next else None
+        st.button("Next", key=f"{key}_next", disabled=not has_next,
+                  on_click=_next_page, args=(key, cursor))
+
+    return jobs, compact
+
+
+def job_table(jobs, key):
+    # One dataframe widget for the whole page instead of a container per job,
+    # returns the positions of the selected rows
+    event = st.dataframe(
+        jobs[TABLE_COLUMNS],
+        hide_index=True,
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="multi-row",
+        key=f"{key}_table",
+    )
+    return event.selection.rows
+
+
+def job_cards(jobs, key, selectable=False):
+    # returns the positions of the selected jobs (only if selectable)
+    selected = []
+    for position, (_, job) in enumerate(jobs.iterrows()):
+        with st.container(border=True):
+            col1, col2, col3 = st.columns([2,2,1])
+
+            with col1:
+                if selectable and st.checkbox("Select", key=f"select_{job['job_id']}"):
+                    selected.append(position)
+                st.markdown(f"**Job ID:** {job['job_id']}")
+                st.markdown(f"**Client:** {job['client_name']}")
+
+            with col2:
+                st.markdown(f"**Date:** {job['job_date']}")
+                st.markdown(f"**Total:** CHF {job['total_amount']:.2f}")
+
+            with col3:
+                if st.button("Delete", key=job['job_id']):
+                    if delete_jobs([job['job_id']]) is not None:
+                        _done(key, [job['job_id']], 'delete', [job['job_id']], f"Job {job['job_id']} deleted")
+
+            with st.expander("Details"):
+                st.write("**Address:**", job['client_address'])
+                st.write("**Notes:**", job['job_notes'])
+
+                if job['items']:
+                    st.write("**Items:**")
+                    for item in job['items']:
+                        st.write(f"- {item['description']} - {item['quantity']} x CHF{item['price']}")
+    return selected
+
+
+def _done(key, job_ids, action, data, message):
+    # the jobs acted on are deselected, one rerun shows the result
+    st.session_state[UNDO_KEY] = {'action': action, 'data': data, 'message': message, 'time': time.time()}
+    _clear_table_selection(key)
+    for job_id in job_ids:
+        st.session_state.pop(f"select_{job_id}", None)
+    st.rerun()
+
+
+def bulk_actions(jobs, key):
+    # Delete, mark invoiced or paid, or change the date of the selected jobs.
+    # Each action is one write for all of them, followed by a single rerun.
+    if jobs.empty:
+        return
+    job_ids = jobs['job_id'].tolist()
+    with st.container(border=True):
+        st.caption(f"{len(job_ids)} selected")
+        col1, col2, col3, col4, col5 = st.columns([1, 1, 1, 2, 1])
+        with col1:
+            if st.button("Delete", key=f"{key}_bulk_delete"):
+                deleted = delete_jobs(job_ids)
+                if deleted is not None:
+                    _done(key, job_ids, 'delete', job_ids, f"{deleted} jobs deleted")
+        for col, status in ((col2, 'invoiced'), (col3, 'paid')):
+            with col:
+                if st.button(f"Mark {status}", key=f"{key}_bulk_{status}"):
+                    previous = update_jobs(job_ids, status=status)
+                    if previous is not None:
+                        _done(key, job_ids, 'update', previous, f"{len(previous)} jobs marked as {status}")
+        with col4:
+            job_date = st.date_input("New Date", key=f"{key}_bulk_date", label_visibility="collapsed")
+        with col5:
+            if st.button("Change Date", key=f"{key}_bulk_change_date"):
+                job_date = job_date.strftime('%Y-%m-%d')
+                previous = update_jobs(job_ids, job_date=job_date)
+                if previous is not None:
+                    _done(key, job_ids, 'update', previous, f"{len(previous)} jobs moved to {job_date}")
+
+
+def undo_banner():
+    # the last delete or bulk change with its Undo button, until it is too old
+    undo = st.session_state.get(UNDO_KEY)
+    if not undo or time.time() - undo['time'] > UNDO_SECONDS:
+        return
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        st.info(undo['message'])
+    with col2:
+        if st.button("Undo", key="undo"):
+            if undo['action'] == 'delete':
+                restored = restore_deleted_jobs(undo['data'])
+            else:
+                restored = restore_jobs(undo['data'])
+            if restored is not None:
+                del st.session_state[UNDO_KEY]
+                st.rerun()
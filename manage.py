@@ -0,0 +1,335 @@
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from backup import BACKUP_DIR, BACKUP_KEEP
+from job_store import CATALOG_DB, JOB_DB, JOB_STATUSES, job_databases
+
+# Maintenance commands that run outside the Streamlit app, e.g.
+#   python manage.py load-catalog preisliste.csv
+#   python manage.py rebuild-summaries
+#   python manage.py generate-data --directory benchmark_data
+#   python manage.py benchmark --directory benchmark_data --baseline baseline.json
+#   python manage.py invoice --month 2024-05 --output-dir invoices/2024-05
+#   python manage.py statements --from 2024-01-01 --to 2024-12-31 --output-dir statements/2024
+#   python manage.py import-jobs jobs.csv --items items.csv
+#   python manage.py export-jobs jobs.parquet --items items.parquet --from 2024-01-01
+#   python manage.py archive --older-than-days 730
+#   python manage.py maintain --archives
+#   python manage.py backup
+#   python manage.py restore backups/20240501_020000
+
+
+def load_catalog_command(args):
+    from catalog_loader import load_catalog
+    start = time.perf_counter()
+    counts = load_catalog(args.database, args.file, sheet=args.sheet, encoding=args.encoding,
+                          delimiter=args.delimiter, full=args.full, keep_missing=args.keep_missing)
+    print(f"{counts['read']} articles read: {counts['inserted']} inserted, {counts['updated']} updated, "
+          f"{counts['deleted']} deleted in {time.perf_counter() - start:.1f}s")
+
+
+def rebuild_summaries_command(args):
+    # every archive keeps the summaries of its own jobs
+    from migrations import migrate
+    from summaries import rebuild_summaries
+    for path in job_databases(args.database):
+        start = time.perf_counter()
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            migrate(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            rows = rebuild_summaries(conn)
+            conn.commit()
+        finally:
+            conn.close()
+        print(f"{path}: {rows} summary rows rebuilt in {time.perf_counter() - start:.1f}s")
+
+
+def generate_data_command(args):
+    from sample_data import generate_catalog, generate_jobs
+    os.makedirs(args.directory, exist_ok=True)
+    job_db = os.path.join(args.directory, JOB_DB)
+    catalog_db = os.path.join(args.directory, CATALOG_DB)
+    if os.path.exists(job_db) and not args.append:
+        raise SystemExit(f"{job_db} already exists, use --append to add to it")
+
+    start = time.perf_counter()
+    if args.articles:
+        counts = generate_catalog(catalog_db, args.articles, seed=args.seed)
+        print(f"{counts['inserted']} catalog articles written in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    counts = generate_jobs(job_db, args.jobs, items_per_job=args.items_per_job, years=args.years,
+                           catalog=catalog_db if os.path.exists(catalog_db) else None, seed=args.seed)
+    print(f"{counts['jobs']} jobs with {counts['items']} items written in {time.perf_counter() - start:.1f}s")
+
+
+def benchmark_command(args):
+    # the app's modules open the databases relative to the working directory
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    output = os.path.abspath(args.output)
+    os.chdir(args.directory)
+    from benchmarks import compare, load_results, run_benchmarks, save_results
+    results = run_benchmarks(repeat=args.repeat, only=args.only)
+    save_results(results, output)
+    print(f"results written to {output}")
+
+    if baseline:
+        rows = compare(results, load_results(baseline), args.threshold)
+        print(f"\n{'case':<40} {'baseline':>10} {'now':>10} {'ratio':>7}")
+        for name, before, now, ratio, regressed in rows:
+            print(f"{name:<40} {before:>10.2f} {now:>10.2f} {ratio:>6.2f}x{'  REGRESSION' if regressed else ''}")
+        regressions = sum(regressed for *_, regressed in rows)
+        if regressions:
+            raise SystemExit(f"{regressions} of {len(rows)} cases slower than {args.threshold}x the baseline")
+
+
+def import_jobs_command(args):
+    from job_transfer import import_jobs
+    start = time.perf_counter()
+    counts = import_jobs(args.database, args.jobs, args.items, encoding=args.encoding, delimiter=args.delimiter)
+    print(f"{counts['read_jobs']} jobs and {counts['read_items']} items read: {counts['jobs']} jobs with "
+          f"{counts['items']} items imported, {counts['skipped']} jobs already there skipped "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+def export_jobs_command(args):
+    from job_transfer import export_jobs
+    start = time.perf_counter()
+    counts = export_jobs(args.database, args.jobs, args.items, args.date_from, args.date_to, args.search,
+                         client=args.client, status=args.status, delimiter=args.delimiter)
+    print(f"{counts['jobs']} jobs and {counts['items']} items written in {time.perf_counter() - start:.1f}s")
+
+
+def archive_command(args):
+    from archive import archive_jobs, maintain
+    start = time.perf_counter()
+    moved = archive_jobs(args.database, args.older_than_days)
+    for year, jobs in moved.items():
+        print(f"{year}: {jobs} jobs archived")
+    print(f"{sum(moved.values())} jobs archived in {time.perf_counter() - start:.1f}s")
+    if moved and not args.no_maintain:
+        _report_maintenance(maintain(args.database))
+
+
+def maintain_command(args):
+    from archive import maintain
+    _report_maintenance(maintain(args.database, archives=args.archives))
+
+
+def _report_maintenance(sizes):
+    for path, (before, after) in sizes.items():
+        print(f"{path}: maintained, {before / 2**20:.1f} MB -> {after / 2**20:.1f} MB")
+
+
+def backup_command(args):
+    from backup import backup_database
+    start = time.perf_counter()
+    snapshot = backup_database(args.database, args.backup_dir, keep=args.keep)
+    size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(snapshot) for name in names)
+    print(f"{snapshot}: {size / 2**20:.1f} MB written in {time.perf_counter() - start:.1f}s")
+
+
+def verify_backup_command(args):
+    from backup import snapshots, verify_snapshot
+    failed = 0
+    for snapshot in args.snapshots or snapshots(args.backup_dir):
+        try:
+            print(f"{snapshot}: {len(verify_snapshot(snapshot))} files ok")
+        except ValueError as e:
+            print(e)
+            failed += 1
+    if failed:
+        raise SystemExit(f"{failed} snapshots failed the check")
+
+
+def restore_command(args):
+    from backup import restore_snapshot
+    start = time.perf_counter()
+    try:
+        safety = restore_snapshot(args.snapshot, args.database, args.backup_dir, safety_backup=not args.no_safety_backup)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if safety:
+        print(f"The databases as they were are in {safety}")
+    print(f"{args.snapshot} restored in {time.perf_counter() - start:.1f}s")
+
+
+def _month_range(month):
+    # 'YYYY-MM' -> first and last day as ISO dates
+    try:
+        first = datetime.strptime(month, '%Y-%m').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a month as YYYY-MM, got '{month}'")
+    last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return first.isoformat(), last.isoformat()
+
+
+def invoice_command(args):
+    # The jobs stream from the database in batches and their PDFs are written
+    # chunk by chunk, so a whole year of invoices runs in constant memory.
+    if args.month and args.date_to:
+        raise SystemExit("--to can't be combined with --month")
+    output_dir = os.path.abspath(args.output_dir)
+    os.chdir(args.directory)
+    from invoicing import write_invoice_files
+    from job_store import iter_jobs, set_job_status
+
+    date_from, date_to = args.month if args.month else (args.date_from, args.date_to)
+    invoiced = []
+
+    def jobs():
+        for job in iter_jobs(date_from, date_to, args.search, client=args.client, status=args.status):
+            invoiced.append(job['job_id'])
+            yield job
+
+    start = time.perf_counter()
+    written = write_invoice_files(jobs(), output_dir, skip_existing=args.skip_existing)
+    print(f"{len(invoiced)} jobs, {written} invoices written to {output_dir} in {time.perf_counter() - start:.1f}s")
+    if args.mark_invoiced and invoiced:
+        print(f"{set_job_status(invoiced, 'invoiced')} jobs marked as invoiced")
+
+
+def statements_command(args):
+    # one statement per client with jobs in the period, plus the period report
+    if args.month and args.date_to:
+        raise SystemExit("--to can't be combined with --month")
+    output_dir = os.path.abspath(args.output_dir)
+    os.chdir(args.directory)
+    from statements import VAT_RATE, write_statements
+
+    date_from, date_to = args.month if args.month else (args.date_from, args.date_to)
+    start = time.perf_counter()
+    written = write_statements(output_dir, date_from, date_to, client=args.client, status=args.status,
+                               output=args.format,
+                               vat_rate=VAT_RATE if args.vat_rate is None else args.vat_rate)
+    print(f"{written} client statements and the period report written to {output_dir} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Plumby maintenance commands")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('load-catalog', help="load or update the BR_Bauhandel catalog from a CSV/Excel price list")
+    p.add_argument('file', help="price list (.csv or .xlsx) with the columns ArtikelNr, AFNr, AF Bezeichnung, Beschreibung, Preis")
+    p.add_argument('--database', default=CATALOG_DB)
+    p.add_argument('--sheet', help="worksheet of an Excel price list (default: the active one)")
+    p.add_argument('--encoding', default='utf-8-sig', help="encoding of a CSV price list")
+    p.add_argument('--delimiter', help="CSV delimiter (default: detected)")
+    p.add_argument('--full', action='store_true', help="replace the whole catalog instead of applying the changes")
+    p.add_argument('--keep-missing', action='store_true', help="keep articles that are no longer in the price list")
+    p.set_defaults(func=load_catalog_command)
+
+    p = commands.add_parser('rebuild-summaries', help="recompute the dashboard summary tables from all jobs")
+    p.add_argument('--database', default=JOB_DB)
+    p.set_defaults(func=rebuild_summaries_command)
+
+    p = commands.add_parser('generate-data', help="fill a job and a catalog database with synthetic data for benchmarks")
+    p.add_argument('--directory', default='benchmark_data', help="where the databases are created")
+    p.add_argument('--jobs', type=int, default=100000)
+    p.add_argument('--items-per-job', type=int, default=10, help="average number of items per job")
+    p.add_argument('--articles', type=int, default=500000, help="catalog rows (0 keeps the existing catalog)")
+    p.add_argument('--years', type=int, default=5, help="the jobs are spread over this many years up to today")
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--append', action='store_true', help="add the jobs to an existing job database")
+    p.set_defaults(func=generate_data_command)
+
+    p = commands.add_parser('benchmark', help="time the hot paths against the databases in a directory")
+    p.add_argument('--directory', default='benchmark_data')
+    p.add_argument('--output', default='benchmark_results.json', help="JSON file for the results")
+    p.add_argument('--baseline', help="results of an earlier run to compare with")
+    p.add_argument('--threshold', type=float, default=1.25, help="slowdown of the median that counts as a regression")
+    p.add_argument('--repeat', type=int, default=5, help="timed runs per case")
+    p.add_argument('--only', nargs='+', help="run only the cases starting with these names, e.g. get_jobs catalog")
+    p.set_defaults(func=benchmark_command)
+
+    p = commands.add_parser('import-jobs', help="add jobs and their items from CSV or Parquet files")
+    p.add_argument('jobs', help="jobs file (.csv or .parquet) with the columns job_id, client_name, job_date and "
+                                "optionally client_address, job_notes, total_amount, timestamp, status")
+    p.add_argument('--items', help="items file with the columns job_id, type, description, price, quantity and "
+                                   "optionally article_nr")
+    p.add_argument('--database', default=JOB_DB)
+    p.add_argument('--encoding', default='utf-8-sig', help="encoding of CSV files")
+    p.add_argument('--delimiter', help="CSV delimiter (default: detected)")
+    p.set_defaults(func=import_jobs_command)
+
+    p = commands.add_parser('export-jobs', help="write jobs and their items to CSV or Parquet files")
+    p.add_argument('jobs', help="jobs file to write (.csv or .parquet)")
+    p.add_argument('--items', help="items file to write")
+    p.add_argument('--database', default=JOB_DB)
+    p.add_argument('--from', dest='date_from', help="first job date, YYYY-MM-DD")
+    p.add_argument('--to', dest='date_to', help="last job date, YYYY-MM-DD")
+    p.add_argument('--client', help="only the jobs of this client (exact name, case-insensitive)")
+    p.add_argument('--search', help="only jobs matching this search term, as on the job list")
+    p.add_argument('--status', choices=JOB_STATUSES, help="only jobs with this status")
+    p.add_argument('--delimiter', default=',', help="CSV delimiter")
+    p.set_defaults(func=export_jobs_command)
+
+    p = commands.add_parser('archive', help="move old jobs into yearly archive databases")
+    p.add_argument('--database', default=JOB_DB)
+    p.add_argument('--older-than-days', type=int, default=730, help="archive the jobs dated more than this many days ago")
+    p.add_argument('--no-maintain', action='store_true', help="skip the VACUUM and ANALYZE of the job database afterwards")
+    p.set_defaults(func=archive_command)
+
+    p = commands.add_parser('maintain', help="compact the search index, VACUUM and ANALYZE the job database")
+    p.add_argument('--database', default=JOB_DB)
+    p.add_argument('--archives', action='store_true', help="the archive databases as well")
+    p.set_defaults(func=maintain_command)
+
+    p = commands.add_parser('backup', help="write a snapshot of the job database and its archives while the app runs")
+    p.add_argument('--database', default=JOB_DB)
+    p.add_argument('--backup-dir', default=BACKUP_DIR)
+    p.add_argument('--keep', type=int, default=BACKUP_KEEP, help="number of snapshots kept, older ones are removed")
+    p.set_defaults(func=backup_command)
+
+    p = commands.add_parser('verify-backup', help="check snapshots against their checksums")
+    p.add_argument('snapshots', nargs='*', help="snapshot directories, all in --backup-dir by default")
+    p.add_argument('--backup-dir', default=BACKUP_DIR)
+    p.set_defaults(func=verify_backup_command)
+
+    p = commands.add_parser('restore', help="replace the job database and its archives with a snapshot")
+    p.add_argument('snapshot', help="snapshot directory, e.g. backups/20240501_020000")
+    p.add_argument('--database', default=JOB_DB)
+    p.add_argument('--backup-dir', default=BACKUP_DIR, help="where the safety backup of the current databases goes")
+    p.add_argument('--no-safety-backup', action='store_true', help="don't back up the current databases first")
+    p.set_defaults(func=restore_command)
+
+    p = commands.add_parser('invoice', help="write the invoice PDFs of the matching jobs into a directory")
+    p.add_argument('--output-dir', required=True, help="one PDF per job is written here")
+    p.add_argument('--directory', default='.', help="where the databases are")
+    dates = p.add_mutually_exclusive_group()
+    dates.add_argument('--month', type=_month_range, help="jobs of one month, YYYY-MM")
+    dates.add_argument('--from', dest='date_from', help="first job date, YYYY-MM-DD")
+    p.add_argument('--to', dest='date_to', help="last job date, YYYY-MM-DD")
+    p.add_argument('--client', help="only the jobs of this client (exact name, case-insensitive)")
+    p.add_argument('--search', help="only jobs matching this search term, as on the job list")
+    p.add_argument('--status', choices=JOB_STATUSES, help="only jobs with this status")
+    p.add_argument('--skip-existing', action='store_true', help="keep invoices already in the output directory")
+    p.add_argument('--mark-invoiced', action='store_true', help="set the status of the invoiced jobs to 'invoiced'")
+    p.set_defaults(func=invoice_command)
+
+    p = commands.add_parser('statements', help="write a statement per client and a period report, as PDF or CSV")
+    p.add_argument('--output-dir', required=True, help="one file per client is written here")
+    p.add_argument('--directory', default='.', help="where the databases are")
+    dates = p.add_mutually_exclusive_group()
+    dates.add_argument('--month', type=_month_range, help="jobs of one month, YYYY-MM")
+    dates.add_argument('--from', dest='date_from', help="first job date, YYYY-MM-DD")
+    p.add_argument('--to', dest='date_to', help="last job date, YYYY-MM-DD")
+    p.add_argument('--client', help="only this client (exact name, case-insensitive)")
+    p.add_argument('--status', choices=JOB_STATUSES, help="only jobs with this status")
+    p.add_argument('--format', choices=['pdf', 'csv'], default='pdf')
+    p.add_argument('--vat-rate', type=float, help="VAT rate on the net amounts, 0.081 by default")
+    p.set_defaults(func=statements_command)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
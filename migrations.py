@@ -0,0 +1,441 @@
+import sqlite3
+
+# Schema history of job_data.db. The number of the last applied migration is
+# stored in PRAGMA user_version, so every migration runs exactly once per
+# database file. Only ever append to this list, never edit an applied entry.
+
+MIGRATIONS = [
+    # 1: the original tables (they already exist in databases created before
+    # migrations were introduced, hence IF NOT EXISTS)
+    ('''CREATE TABLE IF NOT EXISTS jobs
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id TEXT,
+        client_name TEXT,
+        client_address TEXT,
+        job_date TEXT,
+        job_notes TEXT,
+        total_amount REAL,
+        timestamp TEXT);
+
+    CREATE TABLE IF NOT EXISTS job_items
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id TEXT,
+        type TEXT,
+        description TEXT,
+        price REAL,
+        quantity REAL);
+    '''),
+
+    # 2: indexes for the job list filters and the item lookups, and a foreign
+    # key so deleting a job also deletes its items. SQLite can't add a foreign
+    # key to an existing table, so job_items is copied into a new one.
+    # Jobs saved in the same second share a job_id, those get their row id
+    # appended so the unique index can be built.
+    ('''UPDATE jobs SET job_id = job_id || '_' || id
+        WHERE id NOT IN (SELECT MIN(id) FROM jobs GROUP BY job_id);
+    CREATE UNIQUE INDEX idx_jobs_job_id ON jobs (job_id);
+    CREATE INDEX idx_jobs_job_date ON jobs (job_date);
+
+    DELETE FROM job_items WHERE NOT EXISTS (SELECT 1 FROM jobs j WHERE j.job_id = job_items.job_id);
+    CREATE TABLE job_items_new
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id TEXT NOT NULL REFERENCES jobs (job_id) ON DELETE CASCADE,
+        type TEXT,
+        description TEXT,
+        price REAL,
+        quantity REAL);
+    INSERT INTO job_items_new (id, job_id, type, description, price, quantity)
+        SELECT id, job_id, type, description, price, quantity FROM job_items;
+    DROP TABLE job_items;
+    ALTER TABLE job_items_new RENAME TO job_items;
+    CREATE INDEX idx_job_items_job_id ON job_items (job_id);
+    '''),
+
+    # 3: the job list pages through jobs by (job_date, job_id), a composite
+    # index serves both the date filter and the keyset pagination
+    ('''DROP INDEX idx_jobs_job_date;
+    CREATE INDEX idx_jobs_date_job_id ON jobs (job_date, job_id);
+    '''),
+
+    # 4: counters for ids that have to be unique across concurrent saves
+    ('''CREATE TABLE id_counters
+        (name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL);
+    '''),
+
+    # 5: job status (open / invoiced / paid), the article number of catalog
+    # items, and summary tables for the dashboard. Triggers keep the
+    # summaries up to date, so the dashboard reads a few pre-aggregated rows
+    # instead of grouping all jobs and items. Items are counted on their
+    # job's date; when a job is deleted its trigger takes its items out of
+    # the summaries before the cascade removes them.
+    ('''ALTER TABLE jobs ADD COLUMN status TEXT NOT NULL DEFAULT 'open';
+    ALTER TABLE job_items ADD COLUMN article_nr TEXT;
+
+    CREATE TABLE summary_revenue
+        (day TEXT NOT NULL,
+        client_name TEXT NOT NULL,
+        status TEXT NOT NULL,
+        jobs INTEGER NOT NULL,
+        total REAL NOT NULL,
+        PRIMARY KEY (day, client_name, status));
+
+    CREATE TABLE summary_item_types
+        (day TEXT NOT NULL,
+        type TEXT NOT NULL,
+        items INTEGER NOT NULL,
+        amount REAL NOT NULL,
+        PRIMARY KEY (day, type));
+
+    CREATE TABLE summary_articles
+        (article_nr TEXT NOT NULL,
+        description TEXT NOT NULL,
+        items INTEGER NOT NULL,
+        quantity REAL NOT NULL,
+        amount REAL NOT NULL,
+        PRIMARY KEY (article_nr, description));
+
+    CREATE TRIGGER summary_jobs_insert AFTER INSERT ON jobs BEGIN
+        INSERT INTO summary_revenue (day, client_name, status, jobs, total)
+        VALUES (COALESCE(new.job_date, ''), COALESCE(new.client_name, ''), new.status, 1, COALESCE(new.total_amount, 0))
+        ON CONFLICT (day, client_name, status) DO UPDATE
+        SET jobs = jobs + 1, total = total + excluded.total;
+    END;
+
+    CREATE TRIGGER summary_jobs_delete BEFORE DELETE ON jobs BEGIN
+        UPDATE summary_revenue SET jobs = jobs - 1, total = total - COALESCE(old.total_amount, 0)
+        WHERE day = COALESCE(old.job_date, '') AND client_name = COALESCE(old.client_name, '') AND status = old.status;
+
+        INSERT INTO summary_item_types (day, type, items, amount)
+        SELECT COALESCE(old.job_date, ''), COALESCE(type, ''), -COUNT(*), -SUM(COALESCE(price * quantity, 0))
+        FROM job_items WHERE job_id = old.job_id GROUP BY COALESCE(type, '')
+        ON CONFLICT (day, type) DO UPDATE
+        SET items = items + excluded.items, amount = amount + excluded.amount;
+
+        INSERT INTO summary_articles (article_nr, description, items, quantity, amount)
+        SELECT article_nr, COALESCE(description, ''), -COUNT(*), -SUM(COALESCE(quantity, 0)), -SUM(COALESCE(price * quantity, 0))
+        FROM job_items WHERE job_id = old.job_id AND type = 'catalog' AND article_nr IS NOT NULL
+        GROUP BY article_nr, COALESCE(description, '')
+        ON CONFLICT (article_nr, description) DO UPDATE
+        SET items = items + excluded.items, quantity = quantity + excluded.quantity, amount = amount + excluded.amount;
+
+        DELETE FROM summary_revenue WHERE jobs = 0;
+        DELETE FROM summary_item_types WHERE items = 0;
+        DELETE FROM summary_articles WHERE items = 0;
+    END;
+
+    CREATE TRIGGER summary_jobs_update AFTER UPDATE OF job_date, client_name, status, total_amount ON jobs BEGIN
+        UPDATE summary_revenue SET jobs = jobs - 1, total = total - COALESCE(old.total_amount, 0)
+        WHERE day = COALESCE(old.job_date, '') AND client_name = COALESCE(old.client_name, '') AND status = old.status;
+
+        INSERT INTO summary_revenue (day, client_name, status, jobs, total)
+        VALUES (COALESCE(new.job_date, ''), COALESCE(new.client_name, ''), new.status, 1, COALESCE(new.total_amount, 0))
+        ON CONFLICT (day, client_name, status) DO UPDATE
+        SET jobs = jobs + 1, total = total + excluded.total;
+
+        DELETE FROM summary_revenue WHERE jobs = 0;
+    END;
+
+    CREATE TRIGGER summary_jobs_move AFTER UPDATE OF job_date ON jobs WHEN old.job_date IS NOT new.job_date BEGIN
+        INSERT INTO summary_item_types (day, type, items, amount)
+        SELECT COALESCE(old.job_date, ''), COALESCE(type, ''), -COUNT(*), -SUM(COALESCE(price * quantity, 0))
+        FROM job_items WHERE job_id = new.job_id GROUP BY COALESCE(type, '')
+        ON CONFLICT (day, type) DO UPDATE
+        SET items = items + excluded.items, amount = amount + excluded.amount;
+
+        INSERT INTO summary_item_types (day, type, items, amount)
+        SELECT COALESCE(new.job_date, ''), COALESCE(type, ''), COUNT(*), SUM(COALESCE(price * quantity, 0))
+        FROM job_items WHERE job_id = new.job_id GROUP BY COALESCE(type, '')
+        ON CONFLICT (day, type) DO UPDATE
+        SET items = items + excluded.items, amount = amount + excluded.amount;
+
+        DELETE FROM summary_item_types WHERE items = 0;
+    END;
+
+    CREATE TRIGGER summary_items_insert AFTER INSERT ON job_items BEGIN
+        INSERT INTO summary_item_types (day, type, items, amount)
+        SELECT COALESCE(job_date, ''), COALESCE(new.type, ''), 1, COALESCE(new.price * new.quantity, 0)
+        FROM jobs WHERE job_id = new.job_id
+        ON CONFLICT (day, type) DO UPDATE
+        SET items = items + 1, amount = amount + excluded.amount;
+
+        INSERT INTO summary_articles (article_nr, description, items, quantity, amount)
+        SELECT new.article_nr, COALESCE(new.description, ''), 1, COALESCE(new.quantity, 0), COALESCE(new.price * new.quantity, 0)
+        WHERE new.type = 'catalog' AND new.article_nr IS NOT NULL
+        ON CONFLICT (article_nr, description) DO UPDATE
+        SET items = items + excluded.items, quantity = quantity + excluded.quantity, amount = amount + excluded.amount;
+    END;
+
+    CREATE TRIGGER summary_items_delete AFTER DELETE ON job_items
+    WHEN EXISTS (SELECT 1 FROM jobs WHERE job_id = old.job_id) BEGIN
+        UPDATE summary_item_types SET items = items - 1, amount = amount - COALESCE(old.price * old.quantity, 0)
+        WHERE type = COALESCE(old.type, '') AND day = (SELECT COALESCE(job_date, '') FROM jobs WHERE job_id = old.job_id);
+
+        UPDATE summary_articles SET items = items - 1, quantity = quantity - COALESCE(old.quantity, 0), amount = amount - COALESCE(old.price * old.quantity, 0)
+        WHERE old.type = 'catalog' AND article_nr = old.article_nr AND description = COALESCE(old.description, '');
+
+        DELETE FROM summary_item_types WHERE items = 0;
+        DELETE FROM summary_articles WHERE items = 0;
+    END;
+
+    INSERT INTO summary_revenue (day, client_name, status, jobs, total)
+    SELECT COALESCE(job_date, ''), COALESCE(client_name, ''), status, COUNT(*), SUM(COALESCE(total_amount, 0))
+    FROM jobs GROUP BY 1, 2, 3;
+
+    INSERT INTO summary_item_types (day, type, items, amount)
+    SELECT COALESCE(j.job_date, ''), COALESCE(i.type, ''), COUNT(*), SUM(COALESCE(i.price * i.quantity, 0))
+    FROM job_items i JOIN jobs j ON j.job_id = i.job_id GROUP BY 1, 2;
+    '''),
+
+    # 6: trigram full-text index for the job search, one document per job with
+    # the descriptions of all its items, so a job is also found by the material
+    # used. The documents are kept in job_search (id = jobs.id), an external
+    # content table for jobs_fts: its triggers hand FTS5 the old and new text,
+    # so changes never have to query the index, which would flush its pending
+    # writes on every item of a save.
+    ('''CREATE TABLE job_search
+        (id INTEGER PRIMARY KEY,
+        job_id TEXT,
+        client_name TEXT,
+        client_address TEXT,
+        job_notes TEXT,
+        items TEXT);
+
+    CREATE VIRTUAL TABLE jobs_fts USING fts5(
+        job_id, client_name, client_address, job_notes, items,
+        content='job_search', content_rowid='id', tokenize='trigram');
+
+    CREATE TRIGGER job_search_insert AFTER INSERT ON job_search BEGIN
+        INSERT INTO jobs_fts (rowid, job_id, client_name, client_address, job_notes, items)
+        VALUES (new.id, new.job_id, new.client_name, new.client_address, new.job_notes, new.items);
+    END;
+
+    CREATE TRIGGER job_search_delete AFTER DELETE ON job_search BEGIN
+        INSERT INTO jobs_fts (jobs_fts, rowid, job_id, client_name, client_address, job_notes, items)
+        VALUES ('delete', old.id, old.job_id, old.client_name, old.client_address, old.job_notes, old.items);
+    END;
+
+    CREATE TRIGGER job_search_update AFTER UPDATE ON job_search BEGIN
+        INSERT INTO jobs_fts (jobs_fts, rowid, job_id, client_name, client_address, job_notes, items)
+        VALUES ('delete', old.id, old.job_id, old.client_name, old.client_address, old.job_notes, old.items);
+        INSERT INTO jobs_fts (rowid, job_id, client_name, client_address, job_notes, items)
+        VALUES (new.id, new.job_id, new.client_name, new.client_address, new.job_notes, new.items);
+    END;
+
+    CREATE TRIGGER job_search_jobs_insert AFTER INSERT ON jobs BEGIN
+        INSERT INTO job_search (id, job_id, client_name, client_address, job_notes, items)
+        VALUES (new.id, new.job_id, new.client_name, new.client_address, new.job_notes,
+                (SELECT group_concat(description, ' ') FROM job_items WHERE job_id = new.job_id));
+    END;
+
+    CREATE TRIGGER job_search_jobs_update AFTER UPDATE OF job_id, client_name, client_address, job_notes ON jobs BEGIN
+        UPDATE job_search SET job_id = new.job_id, client_name = new.client_name,
+                              client_address = new.client_address, job_notes = new.job_notes
+        WHERE id = new.id;
+    END;
+
+    CREATE TRIGGER job_search_jobs_delete AFTER DELETE ON jobs BEGIN
+        DELETE FROM job_search WHERE id = old.id;
+    END;
+
+    CREATE TRIGGER job_search_items_insert AFTER INSERT ON job_items BEGIN
+        UPDATE job_search SET items = trim(COALESCE(items, '') || ' ' || COALESCE(new.description, ''))
+        WHERE id = (SELECT id FROM jobs WHERE job_id = new.job_id);
+    END;
+
+    CREATE TRIGGER job_search_items_delete AFTER DELETE ON job_items BEGIN
+        UPDATE job_search SET items = (SELECT group_concat(description, ' ') FROM job_items WHERE job_id = old.job_id)
+        WHERE id = (SELECT id FROM jobs WHERE job_id = old.job_id);
+    END;
+
+    CREATE TRIGGER job_search_items_update AFTER UPDATE OF job_id, description ON job_items BEGIN
+        UPDATE job_search SET items = (SELECT group_concat(description, ' ') FROM job_items i WHERE i.job_id = job_search.job_id)
+        WHERE id IN (SELECT id FROM jobs WHERE job_id IN (old.job_id, new.job_id));
+    END;
+
+    INSERT INTO job_search (id, job_id, client_name, client_address, job_notes, items)
+    SELECT id, job_id, client_name, client_address, job_notes,
+           (SELECT group_concat(description, ' ') FROM job_items WHERE job_id = jobs.job_id)
+    FROM jobs;
+    '''),
+
+    # 7: soft delete. A deleted job keeps its row with deleted_at set until
+    # its undo window is over and it's purged; lists, searches and figures
+    # only count jobs whose deleted_at is NULL. The job list index only holds
+    # those, and the summary triggers take a job and its items out of the
+    # summaries when it's marked and put them back when the mark is cleared.
+    # The recreated triggers only clear the summary rows they changed, the
+    # full scans for empty rows made every changed job cost a few ms.
+    ('''ALTER TABLE jobs ADD COLUMN deleted_at TEXT;
+    DROP INDEX idx_jobs_date_job_id;
+    CREATE INDEX idx_jobs_date_job_id ON jobs (job_date, job_id) WHERE deleted_at IS NULL;
+    CREATE INDEX idx_jobs_deleted_at ON jobs (deleted_at) WHERE deleted_at IS NOT NULL;
+
+    DROP TRIGGER summary_jobs_delete;
+    CREATE TRIGGER summary_jobs_delete BEFORE DELETE ON jobs WHEN old.deleted_at IS NULL BEGIN
+        UPDATE summary_revenue SET jobs = jobs - 1, total = total - COALESCE(old.total_amount, 0)
+        WHERE day = COALESCE(old.job_date, '') AND client_name = COALESCE(old.client_name, '') AND status = old.status;
+
+        INSERT INTO summary_item_types (day, type, items, amount)
+        SELECT COALESCE(old.job_date, ''), COALESCE(type, ''), -COUNT(*), -SUM(COALESCE(price * quantity, 0))
+        FROM job_items WHERE job_id = old.job_id GROUP BY COALESCE(type, '')
+        ON CONFLICT (day, type) DO UPDATE
+        SET items = items + excluded.items, amount = amount + excluded.amount;
+
+        INSERT INTO summary_articles (article_nr, description, items, quantity, amount)
+        SELECT article_nr, COALESCE(description, ''), -COUNT(*), -SUM(COALESCE(quantity, 0)), -SUM(COALESCE(price * quantity, 0))
+        FROM job_items WHERE job_id = old.job_id AND type = 'catalog' AND article_nr IS NOT NULL
+        GROUP BY article_nr, COALESCE(description, '')
+        ON CONFLICT (article_nr, description) DO UPDATE
+        SET items = items + excluded.items, quantity = quantity + excluded.quantity, amount = amount + excluded.amount;
+
+        DELETE FROM summary_revenue WHERE day = COALESCE(old.job_date, '') AND client_name = COALESCE(old.client_name, '')
+        AND status = old.status AND jobs = 0;
+        DELETE FROM summary_item_types WHERE day = COALESCE(old.job_date, '') AND items = 0;
+        DELETE FROM summary_articles WHERE article_nr IN (SELECT article_nr FROM job_items WHERE job_id = old.job_id)
+        AND items = 0;
+    END;
+
+    DROP TRIGGER summary_jobs_update;
+    CREATE TRIGGER summary_jobs_update AFTER UPDATE OF job_date, client_name, status, total_amount, deleted_at ON jobs BEGIN
+        UPDATE summary_revenue SET jobs = jobs - 1, total = total - COALESCE(old.total_amount, 0)
+        WHERE day = COALESCE(old.job_date, '') AND client_name = COALESCE(old.client_name, '') AND status = old.status
+        AND old.deleted_at IS NULL;
+
+        INSERT INTO summary_revenue (day, client_name, status, jobs, total)
+        SELECT COALESCE(new.job_date, ''), COALESCE(new.client_name, ''), new.status, 1, COALESCE(new.total_amount, 0)
+        WHERE new.deleted_at IS NULL
+        ON CONFLICT (day, client_name, status) DO UPDATE
+        SET jobs = jobs + 1, total = total + excluded.total;
+
+        DELETE FROM summary_revenue WHERE day = COALESCE(old.job_date, '') AND client_name = COALESCE(old.client_name, '')
+        AND status = old.status AND jobs = 0;
+    END;
+
+    DROP TRIGGER summary_jobs_move;
+    CREATE TRIGGER summary_jobs_move AFTER UPDATE OF job_date ON jobs
+    WHEN old.job_date IS NOT new.job_date AND old.deleted_at IS NULL AND new.deleted_at IS NULL BEGIN
+        INSERT INTO summary_item_types (day, type, items, amount)
+        SELECT COALESCE(old.job_date, ''), COALESCE(type, ''), -COUNT(*), -SUM(COALESCE(price * quantity, 0))
+        FROM job_items WHERE job_id = new.job_id GROUP BY COALESCE(type, '')
+        ON CONFLICT (day, type) DO UPDATE
+        SET items = items + excluded.items, amount = amount + excluded.amount;
+
+        INSERT INTO summary_item_types (day, type, items, amount)
+        SELECT COALESCE(new.job_date, ''), COALESCE(type, ''), COUNT(*), SUM(COALESCE(price * quantity, 0))
+        FROM job_items WHERE job_id = new.job_id GROUP BY COALESCE(type, '')
+        ON CONFLICT (day, type) DO UPDATE
+        SET items = items + excluded.items, amount = amount + excluded.amount;
+
+        DELETE FROM summary_item_types WHERE day = COALESCE(old.job_date, '') AND items = 0;
+    END;
+
+    CREATE TRIGGER summary_jobs_mark_deleted AFTER UPDATE OF deleted_at ON jobs
+    WHEN old.deleted_at IS NULL AND new.deleted_at IS NOT NULL BEGIN
+        INSERT INTO summary_item_types (day, type, items, amount)
+        SELECT COALESCE(old.job_date, ''), COALESCE(type, ''), -COUNT(*), -SUM(COALESCE(price * quantity, 0))
+        FROM job_items WHERE job_id = new.job_id GROUP BY COALESCE(type, '')
+        ON CONFLICT (day, type) DO UPDATE
+        SET items = items + excluded.items, amount = amount + excluded.amount;
+
+        INSERT INTO summary_articles (article_nr, description, items, quantity, amount)
+        SELECT article_nr, COALESCE(description, ''), -COUNT(*), -SUM(COALESCE(quantity, 0)), -SUM(COALESCE(price * quantity, 0))
+        FROM job_items WHERE job_id = new.job_id AND type = 'catalog' AND article_nr IS NOT NULL
+        GROUP BY article_nr, COALESCE(description, '')
+        ON CONFLICT (article_nr, description) DO UPDATE
+        SET items = items + excluded.items, quantity = quantity + excluded.quantity, amount = amount + excluded.amount;
+
+        DELETE FROM summary_item_types WHERE day = COALESCE(old.job_date, '') AND items = 0;
+        DELETE FROM summary_articles WHERE article_nr IN (SELECT article_nr FROM job_items WHERE job_id = new.job_id)
+        AND items = 0;
+    END;
+
+    CREATE TRIGGER summary_jobs_unmark_deleted AFTER UPDATE OF deleted_at ON jobs
+    WHEN old.deleted_at IS NOT NULL AND new.deleted_at IS NULL BEGIN
+        INSERT INTO summary_item_types (day, type, items, amount)
+        SELECT COALESCE(new.job_date, ''), COALESCE(type, ''), COUNT(*), SUM(COALESCE(price * quantity, 0))
+        FROM job_items WHERE job_id = new.job_id GROUP BY COALESCE(type, '')
+        ON CONFLICT (day, type) DO UPDATE
+        SET items = items + excluded.items, amount = amount + excluded.amount;
+
+        INSERT INTO summary_articles (article_nr, description, items, quantity, amount)
+        SELECT article_nr, COALESCE(description, ''), COUNT(*), SUM(COALESCE(quantity, 0)), SUM(COALESCE(price * quantity, 0))
+        FROM job_items WHERE job_id = new.job_id AND type = 'catalog' AND article_nr IS NOT NULL
+        GROUP BY article_nr, COALESCE(description, '')
+        ON CONFLICT (article_nr, description) DO UPDATE
+        SET items = items + excluded.items, quantity = quantity + excluded.quantity, amount = amount + excluded.amount;
+    END;
+
+    DROP TRIGGER summary_items_delete;
+    CREATE TRIGGER summary_items_delete AFTER DELETE ON job_items
+    WHEN EXISTS (SELECT 1 FROM jobs WHERE job_id = old.job_id AND deleted_at IS NULL) BEGIN
+        UPDATE summary_item_types SET items = items - 1, amount = amount - COALESCE(old.price * old.quantity, 0)
+        WHERE type = COALESCE(old.type, '') AND day = (SELECT COALESCE(job_date, '') FROM jobs WHERE job_id = old.job_id);
+
+        UPDATE summary_articles SET items = items - 1, quantity = quantity - COALESCE(old.quantity, 0), amount = amount - COALESCE(old.price * old.quantity, 0)
+        WHERE old.type = 'catalog' AND article_nr = old.article_nr AND description = COALESCE(old.description, '');
+
+        DELETE FROM summary_item_types
+        WHERE day = (SELECT COALESCE(job_date, '') FROM jobs WHERE job_id = old.job_id) AND items = 0;
+        DELETE FROM summary_articles WHERE article_nr = old.article_nr AND items = 0;
+    END;
+    '''),
+]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _statements(script):
+    # splits a migration into single statements (trigger bodies contain
+    # semicolons too, so it goes by complete statements)
+    statement = ''
+    for part in script.split(';'):
+        statement += part + ';'
+        if sqlite3.complete_statement(statement):
+            if statement.strip(' \n;'):
+                yield statement
+            statement = ''
+
+
+def migrate(conn):
+    # Applies all pending migrations, each one in its own transaction.
+    # Returns the number of migrations that were applied.
+    if schema_version(conn) >= len(MIGRATIONS):
+        return 0
+
+    # foreign keys have to be off while tables are rebuilt, and the pragma
+    # can't be changed inside a transaction
+    conn.commit()
+    conn.execute("PRAGMA foreign_keys=OFF")
+    applied = 0
+    try:
+        while True:
+            # the version is read under the write lock, so when several
+            # processes start at once only one of them applies a migration
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = schema_version(conn)
+                if version >= len(MIGRATIONS):
+                    conn.rollback()
+                    break
+                for statement in _statements(MIGRATIONS[version]):
+                    conn.execute(statement)
+                violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+                if violations:
+                    raise sqlite3.IntegrityError(f"Migration {version + 1} leaves foreign key violations: {violations}")
+                conn.execute(f"PRAGMA user_version={version + 1}")
+                conn.commit()
+                applied += 1
+            except BaseException:
+                conn.rollback()
+                raise
+    finally:
+        conn.execute("PRAGMA foreign_keys=ON")
+
+    if applied:
+        # refresh the statistics the query planner uses to pick indexes
+        conn.execute("ANALYZE")
+        conn.commit()
+    return applied
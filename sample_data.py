@@ -0,0 +1,146 @@
+import csv
+import itertools
+import json
+import os
+import random
+import sqlite3
+import tempfile
+from datetime import date, timedelta
+from catalog_loader import load_catalog
+from job_store import deferred_search_index, deferred_summaries
+from migrations import migrate
+
+# Synthetic but realistic data for benchmarks: a BR_Bauhandel catalog loaded
+# through the regular price list loader, and years of jobs with items that
+# reference it. The same seed always produces the same data.
+
+CHUNK_SIZE = 10000
+
+MATERIALS = ['Kupferrohr', 'Pressfitting', 'Kugelhahn', 'Siphon', 'Spülkasten', 'Thermostat', 'Mischbatterie',
+             'Eckventil', 'PE-Rohr', 'Flexschlauch', 'Boiler', 'Rückflussverhinderer', 'Wandscheibe', 'Dichtung']
+FINISHES = ['verchromt', 'weiss', 'Messing', 'Edelstahl', 'schwarz matt']
+DIMENSIONS = ['DN10', 'DN15', 'DN20', 'DN25', 'DN32', 'DN40', 'DN50', '1/2"', '3/4"', '1"']
+FIRST_NAMES = ['Anna', 'Beat', 'Claudia', 'Daniel', 'Eva', 'Fritz', 'Gabriela', 'Hans', 'Irene', 'Jürg',
+               'Karin', 'Lukas', 'Monika', 'Niklaus', 'Petra', 'Reto', 'Sandra', 'Thomas', 'Ursula', 'Walter']
+LAST_NAMES = ['Müller', 'Meier', 'Schmid', 'Keller', 'Weber', 'Huber', 'Schneider', 'Meyer', 'Steiner',
+              'Fischer', 'Gerber', 'Brunner', 'Baumann', 'Frei', 'Zimmermann', 'Moser', 'Widmer', 'Wyss']
+COMPANIES = ['Immobilien AG', 'Verwaltungen GmbH', 'Bau AG', 'Hauswartungen', 'Wohnbaugenossenschaft']
+STREETS = ['Bahnhofstrasse', 'Hauptstrasse', 'Dorfstrasse', 'Seestrasse', 'Kirchweg', 'Schulstrasse',
+           'Glattwiesenstrasse', 'Industriestrasse', 'Talwiesenstrasse', 'Birkenweg']
+TOWNS = ['8152 Glattbrugg', '8600 Dübendorf', '8050 Zürich', '8304 Wallisellen', '8302 Kloten', '8305 Dietlikon']
+NOTES = ['', '', '', 'Leck unter dem Spülbecken', 'Boiler entkalkt', 'WC-Spülung ersetzt', 'Notfall am Wochenende',
+         'Schlüssel beim Hauswart', 'Offerte nachreichen', 'Zweiter Termin nötig']
+WORK = ['Arbeitszeit Monteur', 'Arbeitszeit Lehrling', 'Fahrzeit', 'Notfallzuschlag']
+
+
+def catalog_rows(articles, seed=0):
+    # (ArtikelNr, AFNr, AF Bezeichnung, Beschreibung, Preis), one to three
+    # finishes per article number
+    rng = random.Random(seed)
+    number = 100000
+    produced = 0
+    while produced < articles:
+        number += rng.randint(1, 3)
+        description = f"{rng.choice(MATERIALS)} {rng.choice(DIMENSIONS)}"
+        base = round(rng.uniform(1, 400), 2)
+        for af in range(min(rng.randint(1, 3), articles - produced)):
+            yield (str(number), f"{af:02d}", rng.choice(FINISHES), description, round(base * (1 + af * 0.15), 2))
+            produced += 1
+
+
+def generate_catalog(database, articles, seed=0):
+    # written as a CSV price list and loaded like a real one
+    fd, path = tempfile.mkstemp(suffix='.csv', prefix='price_list_')
+    try:
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(['ArtikelNr', 'AFNr', 'AF Bezeichnung', 'Beschreibung', 'Preis'])
+            writer.writerows(catalog_rows(articles, seed))
+        return load_catalog(database, path, delimiter=';', full=True)
+    finally:
+        os.remove(path)
+
+
+def _clients(rng, count):
+    clients = []
+    for _ in range(count):
+        if rng.random() < 0.2:
+            name = f"{rng.choice(LAST_NAMES)} {rng.choice(COMPANIES)}"
+        else:
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        clients.append((name, f"{rng.choice(STREETS)} {rng.randint(1, 120)}, {rng.choice(TOWNS)}"))
+    return clients
+
+
+def _jobs(rng, jobs, items_per_job, years, articles):
+    # yields (job row, item rows) in date order, with job_ids in the format of
+    # job_store.new_job_id
+    clients = _clients(rng, max(1, jobs // 50))
+    start = date.today() - timedelta(days=365 * years)
+    days = 365 * years
+    for n in range(jobs):
+        job_date = start + timedelta(days=n * days // jobs)
+        job_id = f"{job_date:%Y%m%d}_{rng.randint(7, 17):02d}{rng.randint(0, 59):02d}{rng.randint(0, 59):02d}_{n + 1:05d}"
+        client_name, client_address = rng.choice(clients)
+
+        items = []
+        for _ in range(max(1, round(rng.gauss(items_per_job, items_per_job / 3)))):
+            kind = rng.random()
+            if kind < 0.6 and articles:
+                artikel, afnr, finish, description, price = rng.choice(articles)
+                quantity = float(rng.randint(1, 10))
+                items.append((job_id, 'catalog', f"{description} (AFNr: {afnr} - {finish})", price, quantity, artikel))
+            elif kind < 0.8:
+                items.append((job_id, 'manual', f"{rng.choice(MATERIALS)} (Kleinmaterial)",
+                              round(rng.uniform(5, 80), 2), float(rng.randint(1, 4)), None))
+            else:
+                items.append((job_id, 'work', rng.choice(WORK), rng.choice([75.0, 95.0, 110.0, 135.0]),
+                              rng.choice([0.5, 1.0, 1.5, 2.0, 3.0, 4.0, 8.0]), None))
+        total = round(sum(price * quantity for _, _, _, price, quantity, _ in items), 2)
+
+        yield ((job_id, client_name, client_address, job_date.isoformat(), rng.choice(NOTES), total,
+                f"{job_date} 18:00:00"), items)
+
+
+def generate_jobs(database, jobs, items_per_job=10, years=5, catalog=None, sample_articles=20000, seed=0):
+    # Appends jobs to the job database in large transactions. Catalog items
+    # reference articles drawn from the catalog database if one is given.
+    # Returns the number of jobs and items written.
+    rng = random.Random(seed)
+    articles = []
+    if catalog:
+        conn = sqlite3.connect(catalog)
+        try:
+            # a seeded sample of rowids, so the same seed picks the same articles
+            last = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM BR_Bauhandel").fetchone()[0]
+            rowids = sorted(rng.sample(range(1, last + 1), min(sample_articles, last)))
+            articles = conn.execute('''SELECT "ArtikelNr", "AFNr", "AF Bezeichnung", "Beschreibung", "Preis"
+                                       FROM BR_Bauhandel WHERE rowid IN (SELECT value FROM json_each(?))
+                                       ORDER BY rowid''', (json.dumps(rowids),)).fetchall()
+        finally:
+            conn.close()
+
+    conn = sqlite3.connect(database, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        migrate(conn)
+        written_jobs = written_items = 0
+        generated = _jobs(rng, jobs, items_per_job, years, articles)
+        while True:
+            chunk = list(itertools.islice(generated, CHUNK_SIZE))
+            if not chunk:
+                break
+            conn.execute("BEGIN IMMEDIATE")
+            with deferred_search_index(conn), deferred_summaries(conn):
+                conn.executemany("""INSERT INTO jobs (job_id, client_name, client_address, job_date, job_notes,
+                                    total_amount, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)""", (job for job, _ in chunk))
+                conn.executemany("""INSERT INTO job_items (job_id, type, description, price, quantity, article_nr)
+                                    VALUES (?, ?, ?, ?, ?, ?)""", (item for _, items in chunk for item in items))
+            conn.commit()
+            written_jobs += len(chunk)
+            written_items += sum(len(items) for _, items in chunk)
+
+        conn.execute("ANALYZE")
+        return {'jobs': written_jobs, 'items': written_items}
+    finally:
+        conn.close()
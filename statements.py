@@ -0,0 +1,224 @@
+import io
+import os
+import re
+import tempfile
+import zipfile
+import numpy as np
+import pandas as pd
+from reportlab.lib import colors
+from reportlab.platypus import Table, Paragraph, Spacer
+from instrumentation import timed
+from invoicing import BANK_DETAILS, HEADER, STYLES, build_pdf, render_parallel
+from job_store import LABOUR_TYPES, archives_for, attach_archives, connect, job_filters
+
+# Client statements and period reports: every job of a client in a period
+# with its labour, material, net amount, VAT and total, and one overview row
+# per client. The jobs and their items are read in two bulk queries and all
+# figures are computed column-wise with pandas, so statements for every
+# client take about as long as the queries plus writing the files.
+
+VAT_RATE = 0.081                # Swiss standard rate
+AMOUNTS = ['labour', 'material', 'net', 'vat', 'gross']
+LINE_COLUMNS = ['job_date', 'job_id', 'status'] + AMOUNTS
+REPORT_COLUMNS = ['client_name', 'jobs'] + AMOUNTS
+
+STATEMENT_TABLE_STYLE = [
+    ('FONT', (0,0), (-1,-1), 'Helvetica'),
+    ('FONTSIZE', (0,0), (-1,-1), 8),
+    ('FONT', (0,-1), (-1,-1), 'Helvetica-Bold'),
+    ('ALIGN', (2,0), (-1,-1), 'RIGHT'),
+    ('LINEBELOW', (0,0), (-1,0), 0.5, colors.black),
+    ('LINEABOVE', (0,-1), (-1,-1), 0.5, colors.black),
+    ('BOTTOMPADDING', (0,0), (-1,-1), 1),
+    ('TOPPADDING', (0,0), (-1,-1), 1),
+]
+
+
+@timed('fetch_statement_data')
+def fetch_statement_data(date_from=None, date_to=None, client=None, status=None):
+    # The matching jobs and all their items as two DataFrames, read from one
+    # snapshot of the job database and the archives the dates reach into
+    filters = (date_from, date_to, None, client, status)
+    with connect() as conn:
+        schemas = attach_archives(conn, archives_for(date_from, date_to))
+        job_arms, item_arms, params = [], [], []
+        for schema in schemas:
+            source, where, arm_params, _ = job_filters(*filters, schema=schema)
+            job_arms.append(f"""SELECT jobs.job_id, jobs.client_name, jobs.client_address, jobs.job_date,
+                                       jobs.status, jobs.total_amount FROM {source} {where}""")
+            item_arms.append(f"""SELECT i.job_id, i.type, i.price, i.quantity
+                                 FROM {source} JOIN {schema}.job_items i ON i.job_id = jobs.job_id {where}""")
+            params.extend(arm_params)
+        conn.execute("BEGIN")
+        try:
+            jobs = pd.read_sql_query(" UNION ALL ".join(job_arms), conn, params=params)
+            items = pd.read_sql_query(" UNION ALL ".join(item_arms), conn, params=params)
+        finally:
+            conn.rollback()
+    return jobs, items
+
+
+def statement_lines(jobs, items, vat_rate=VAT_RATE):
+    # One row per job, ordered by client and date: the items' amounts split
+    # into labour and material, the job total as net amount, VAT and gross
+    amounts = items['price'].fillna(0) * items['quantity'].fillna(0)
+    kind = np.where(items['type'].isin(LABOUR_TYPES), 'labour', 'material')
+    split = (amounts.groupby([items['job_id'], kind]).sum().unstack(fill_value=0.0)
+             .reindex(columns=['labour', 'material'], fill_value=0.0))
+
+    lines = jobs.join(split, on='job_id')
+    lines[['labour', 'material']] = lines[['labour', 'material']].fillna(0.0).round(2)
+    lines['client_name'] = lines['client_name'].fillna('')
+    lines['client_address'] = lines['client_address'].fillna('')
+    lines['net'] = lines['total_amount'].fillna(0.0).round(2)
+    lines['vat'] = (lines['net'] * vat_rate).round(2)
+    lines['gross'] = lines['net'] + lines['vat']
+    return lines.sort_values(['client_name', 'job_date', 'job_id'], ignore_index=True)
+
+
+def client_totals(lines):
+    # the period report: one row per client with the sums of its jobs
+    totals = lines.groupby('client_name', sort=True).agg(
+        jobs=('job_id', 'size'), **{col: (col, 'sum') for col in AMOUNTS})
+    return totals.round(2).reset_index()[REPORT_COLUMNS]
+
+
+def _file_names(clients):
+    # a file name per client, unique even if two names only differ in
+    # characters that can't be part of one
+    names, used = [], set()
+    for client in clients:
+        base = re.sub(r'\W+', '_', client).strip('_')[:60] or 'client'
+        name, n = base, 1
+        while name.lower() in used:
+            n += 1
+            name = f"{base}_{n}"
+        used.add(name.lower())
+        names.append(name)
+    return names
+
+
+def _period(date_from, date_to):
+    if date_from and date_to:
+        return f"{date_from} to {date_to}"
+    if date_from:
+        return f"since {date_from}"
+    if date_to:
+        return f"until {date_to}"
+    return "all jobs"
+
+
+def _money(values):
+    return values.map('{:,.2f}'.format)
+
+
+def _table(header, rows, total, widths):
+    table = Table([header] + rows + [total], colWidths=widths, repeatRows=1)
+    table.setStyle(STATEMENT_TABLE_STYLE)
+    return table
+
+
+def statement_story(statement):
+    # statement: a dict as built by build_statements, with the table rows
+    # already formatted
+    elements = list(HEADER)
+    elements.append(Paragraph("Statement", STYLES['Heading2']))
+    elements.append(Paragraph(statement['client_name'], STYLES['Normal']))
+    elements.append(Paragraph(statement['client_address'], STYLES['Normal']))
+    elements.append(Paragraph(f"Period: {statement['period']}", STYLES['Normal']))
+    elements.append(Spacer(1, 12))
+    elements.append(_table(['Date', 'Job', 'Status', 'Labour', 'Material', 'Net', 'VAT', 'Total CHF'],
+                           statement['rows'], ['Total', f"{len(statement['rows'])} jobs", ''] + statement['total'],
+                           [55, 115, 45, 60, 60, 60, 50, 65]))
+    elements.append(Spacer(1, 6))
+    elements.append(Paragraph(f"VAT {statement['vat_rate'] * 100:.1f}% on the net amount", STYLES['Normal']))
+    elements.append(Spacer(1, 20))
+    elements.extend(BANK_DETAILS)
+    return elements
+
+
+def report_story(report):
+    elements = list(HEADER)
+    elements.append(Paragraph(f"Period Report: {report['period']}", STYLES['Heading2']))
+    elements.append(Spacer(1, 12))
+    elements.append(_table(['Client', 'Jobs', 'Labour', 'Material', 'Net', 'VAT', 'Total CHF'],
+                           report['rows'], ['Total'] + report['total'], [165, 40, 60, 60, 60, 50, 65]))
+    return elements
+
+
+def render_statement(statement):
+    return build_pdf(statement_story(statement), topMargin=30, bottomMargin=30)
+
+
+def render_report(report):
+    return build_pdf(report_story(report), topMargin=30, bottomMargin=30)
+
+
+def _csv(frame, total):
+    return (pd.concat([frame, pd.DataFrame([total])], ignore_index=True)
+            .to_csv(index=False, float_format='%.2f').encode('utf-8'))
+
+
+def build_statements(date_from=None, date_to=None, client=None, status=None, output='pdf', vat_rate=VAT_RATE):
+    # Yields (file name, bytes): one statement per client with jobs in the
+    # period, then the period report, as PDF or CSV
+    jobs, items = fetch_statement_data(date_from, date_to, client, status)
+    lines = statement_lines(jobs, items, vat_rate)
+    totals = client_totals(lines)
+    names = _file_names(totals['client_name'])
+    suffix = f"{date_from or 'start'}_{date_to or 'end'}"
+    groups = lines.groupby('client_name', sort=True)
+
+    if output == 'csv':
+        for name, (_, group), total in zip(names, groups, totals.to_dict('records')):
+            yield f"statement_{name}_{suffix}.csv", _csv(
+                group[LINE_COLUMNS], {'job_date': 'Total', 'job_id': f"{total['jobs']} jobs",
+                                      **{col: total[col] for col in AMOUNTS}})
+        yield f"period_report_{suffix}.csv", _csv(
+            totals, {'client_name': 'Total', 'jobs': totals['jobs'].sum(), **totals[AMOUNTS].sum().round(2).to_dict()})
+        return
+
+    # every amount is formatted in one pass per column, the PDFs only get
+    # the strings
+    formatted = lines[['client_name', 'client_address', 'job_date', 'job_id', 'status']].copy()
+    for col in AMOUNTS:
+        formatted[col] = _money(lines[col])
+    formatted_totals = totals.copy()
+    for col in AMOUNTS:
+        formatted_totals[col] = _money(totals[col])
+    formatted_totals['jobs'] = totals['jobs'].astype(str)
+
+    period = _period(date_from, date_to)
+    statements = [{'client_name': client_name, 'client_address': group['client_address'].iloc[-1],
+                   'period': period, 'vat_rate': vat_rate, 'rows': group[LINE_COLUMNS].values.tolist(),
+                   'total': total}
+                  for (client_name, group), total
+                  in zip(formatted.groupby('client_name', sort=True), formatted_totals[AMOUNTS].values.tolist())]
+    for name, pdf in zip(names, render_parallel(render_statement, statements)):
+        yield f"statement_{name}_{suffix}.pdf", pdf
+    yield f"period_report_{suffix}.pdf", render_report({
+        'period': period, 'rows': formatted_totals[REPORT_COLUMNS].values.tolist(),
+        'total': [str(totals['jobs'].sum())] + _money(totals[AMOUNTS].sum()).tolist()})
+
+
+def write_statements(directory, date_from=None, date_to=None, client=None, status=None, output='pdf',
+                     vat_rate=VAT_RATE):
+    # Writes the files of build_statements into directory, each one complete
+    # or not at all. Returns the number of client statements written.
+    os.makedirs(directory, exist_ok=True)
+    written = -1                # the period report isn't a statement
+    for name, data in build_statements(date_from, date_to, client, status, output, vat_rate):
+        with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as out:
+            out.write(data)
+        os.replace(out.name, os.path.join(directory, name))
+        written += 1
+    return written
+
+
+def statements_zip(date_from=None, date_to=None, client=None, status=None, output='pdf', vat_rate=VAT_RATE):
+    # the files of build_statements as one zip, for a download
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in build_statements(date_from, date_to, client, status, output, vat_rate):
+            archive.writestr(name, data)
+    return buffer.getvalue()
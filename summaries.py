@@ -0,0 +1,106 @@
+import streamlit as st
+import pandas as pd
+from job_store import (LABOUR_TYPES, QUERY_CACHE_TTL, archive_batches, archives_for, attach_archives, connect,
+                       data_version)
+
+# Dashboard figures read from the summary tables of migration 5. Triggers on
+# jobs and job_items keep them current, rebuild_summaries recomputes them from
+# scratch (after a backfill, an import with the triggers off, or to check the
+# triggers: a rebuild must not change any figure). Every archive has the
+# summaries of its own jobs, they are added in when the period reaches back.
+
+TOP_ARTICLES = 10
+
+REBUILD = [
+    "DELETE FROM summary_revenue",
+    "DELETE FROM summary_item_types",
+    "DELETE FROM summary_articles",
+
+    """INSERT INTO summary_revenue (day, client_name, status, jobs, total)
+       SELECT COALESCE(job_date, ''), COALESCE(client_name, ''), status, COUNT(*), SUM(COALESCE(total_amount, 0))
+       FROM jobs WHERE deleted_at IS NULL GROUP BY 1, 2, 3""",
+
+    """INSERT INTO summary_item_types (day, type, items, amount)
+       SELECT COALESCE(j.job_date, ''), COALESCE(i.type, ''), COUNT(*), SUM(COALESCE(i.price * i.quantity, 0))
+       FROM job_items i JOIN jobs j ON j.job_id = i.job_id WHERE j.deleted_at IS NULL GROUP BY 1, 2""",
+
+    """INSERT INTO summary_articles (article_nr, description, items, quantity, amount)
+       SELECT i.article_nr, COALESCE(i.description, ''), COUNT(*), SUM(COALESCE(i.quantity, 0)),
+              SUM(COALESCE(i.price * i.quantity, 0))
+       FROM job_items i JOIN jobs j ON j.job_id = i.job_id
+       WHERE j.deleted_at IS NULL AND i.type = 'catalog' AND i.article_nr IS NOT NULL GROUP BY 1, 2""",
+]
+
+
+def rebuild_summaries(conn):
+    # runs inside the caller's transaction, returns the number of summary rows
+    for statement in REBUILD:
+        conn.execute(statement)
+    return sum(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+               for table in ('summary_revenue', 'summary_item_types', 'summary_articles'))
+
+
+def _summaries(conn, table, columns, where, params, years):
+    # the rows of a summary table from the job database and the archives of years
+    schemas = attach_archives(conn, years)
+    query = " UNION ALL ".join(f"SELECT {columns} FROM {schema}.{table} {where}" for schema in schemas)
+    return pd.read_sql_query(query, conn, params=params * len(schemas))
+
+
+def _period(date_from, date_to):
+    where, params = "WHERE 1=1", []
+    if date_from:
+        where += " AND day >= ?"
+        params.append(date_from)
+    if date_to:
+        where += " AND day <= ?"
+        params.append(date_to)
+    return where, params
+
+
+@st.cache_data(ttl=QUERY_CACHE_TTL, max_entries=64, show_spinner=False)
+def _cached_revenue(version, date_from, date_to):
+    # one row per day, client and status, the dashboard groups them further
+    where, params = _period(date_from, date_to)
+    with connect() as conn:
+        return _summaries(conn, 'summary_revenue', "day, client_name, status, jobs, total", where, params,
+                          archives_for(date_from, date_to))
+
+
+@st.cache_data(ttl=QUERY_CACHE_TTL, max_entries=64, show_spinner=False)
+def _cached_item_types(version, date_from, date_to):
+    where, params = _period(date_from, date_to)
+    with connect() as conn:
+        return _summaries(conn, 'summary_item_types', "day, type, items, amount", where, params,
+                          archives_for(date_from, date_to))
+
+
+@st.cache_data(ttl=QUERY_CACHE_TTL, max_entries=16, show_spinner=False)
+def _cached_top_articles(version, limit):
+    # all time, the article summary isn't kept per day. The archives are
+    # added up a batch at a time, the batches' sums once more at the end.
+    with connect() as conn:
+        years = archives_for()
+        if not years:
+            return pd.read_sql_query("""SELECT article_nr, description, quantity, amount FROM summary_articles
+                                        ORDER BY amount DESC LIMIT ?""", conn, params=[limit])
+        frames = []
+        for schemas in archive_batches(conn, years):
+            articles = " UNION ALL ".join(f"SELECT * FROM {schema}.summary_articles" for schema in schemas)
+            frames.append(pd.read_sql_query(f"""SELECT article_nr, description, SUM(quantity) AS quantity,
+                                                       SUM(amount) AS amount
+                                                FROM ({articles}) GROUP BY article_nr, description""", conn))
+    articles = pd.concat(frames).groupby(['article_nr', 'description'], as_index=False)[['quantity', 'amount']].sum()
+    return articles.sort_values('amount', ascending=False).head(limit).reset_index(drop=True)
+
+
+def get_revenue(date_from=None, date_to=None):
+    return _cached_revenue(data_version(), date_from, date_to)
+
+
+def get_item_types(date_from=None, date_to=None):
+    return _cached_item_types(data_version(), date_from, date_to)
+
+
+def get_top_articles(limit=TOP_ARTICLES):
+    return _cached_top_articles(data_version(), limit)
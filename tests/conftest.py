@@ -0,0 +1,32 @@
+import os
+import sys
+import pytest
+
+# the modules live at the top of the repository, next to the Streamlit pages
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import job_store
+
+
+@pytest.fixture
+def job_db(tmp_path, monkeypatch):
+    # An empty job database in a directory of its own. The database paths are
+    # relative (job_data.db, archive/, the catalog), so every test works in
+    # its own directory with pools of its own.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(job_store, '_pools', {})
+    yield tmp_path / job_store.JOB_DB
+    for pool in job_store._pools.values():
+        for conn in pool._idle:
+            conn.close()
+
+
+def save(job_id, job_date, client='Client', items=(), status=None):
+    # saves a job with items given as (type, description, price, quantity[, article_nr])
+    items = [dict(zip(('type', 'description', 'price', 'quantity', 'article_nr'), item)) for item in items]
+    job_store.save_job({'job_id': job_id, 'client_name': client, 'client_address': 'Street 1', 'job_date': job_date,
+                        'job_notes': '', 'total_amount': sum(item['price'] * item['quantity'] for item in items),
+                        'timestamp': f"{job_date} 08:00:00"}, items)
+    if status:
+        job_store.set_job_status([job_id], status)
+    return job_id
@@ -0,0 +1,65 @@
+import sqlite3
+from archive import archive_jobs
+from conftest import save
+from job_store import JOB_DB, archive_path
+from summaries import rebuild_summaries
+from test_summaries import summary_rows
+
+
+def jobs_in(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT j.job_id, j.total_amount, COUNT(i.id) FROM jobs j LEFT JOIN job_items i "
+                            "ON i.job_id = j.job_id GROUP BY j.job_id ORDER BY j.job_id").fetchall()
+    finally:
+        conn.close()
+
+
+def assert_summaries_rebuilt(path):
+    conn = sqlite3.connect(path)
+    try:
+        maintained = summary_rows(conn)
+        rebuild_summaries(conn)
+        assert summary_rows(conn) == maintained
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def test_archive_moves_old_jobs(job_db):
+    for n in range(4):
+        save(f"J{n}", f"2020-0{n + 1}-01", items=[('work', 'Montage', 80.0, 1), ('material', 'Rohr', 4.5, 2)])
+    save('J9', '2026-01-01', items=[('work', 'Montage', 80.0, 1)])
+
+    assert archive_jobs() == {2020: 4}
+    assert jobs_in(archive_path(2020)) == [(f"J{n}", 89.0, 2) for n in range(4)]
+    assert jobs_in(JOB_DB) == [('J9', 80.0, 1)]
+    assert archive_jobs() == {}
+    for path in (JOB_DB, archive_path(2020)):
+        assert_summaries_rebuilt(path)
+
+
+def test_archive_replaces_copy_of_interrupted_run(job_db):
+    # an earlier run copied J1 and J2 but didn't delete them, then J1 was
+    # edited in the job database
+    save('J1', '2020-02-01', items=[('work', 'Montage', 80.0, 1)])
+    save('J2', '2020-03-01', items=[('work', 'Montage', 80.0, 1)])
+    assert archive_jobs() == {2020: 2}
+    conn = sqlite3.connect(archive_path(2020))
+    conn.execute("ATTACH DATABASE ? AS hot", (JOB_DB,))
+    conn.execute("INSERT INTO hot.jobs SELECT * FROM main.jobs")
+    conn.execute("INSERT INTO hot.job_items SELECT * FROM main.job_items")
+    conn.commit()
+    conn.close()
+    save('J3', '2020-04-01', items=[('work', 'Montage', 80.0, 1)])
+    conn = sqlite3.connect(JOB_DB)
+    conn.execute("INSERT INTO job_items (job_id, type, description, price, quantity) VALUES ('J1', 'work', 'Extra', 20.0, 1)")
+    conn.execute("UPDATE jobs SET total_amount = 100.0 WHERE job_id = 'J1'")
+    conn.commit()
+    conn.close()
+
+    assert archive_jobs() == {2020: 3}
+    assert jobs_in(archive_path(2020)) == [('J1', 100.0, 2), ('J2', 80.0, 1), ('J3', 80.0, 1)]
+    assert jobs_in(JOB_DB) == []
+    for path in (JOB_DB, archive_path(2020)):
+        assert_summaries_rebuilt(path)
@@ -0,0 +1,41 @@
+import sqlite3
+import pytest
+import catalog
+from catalog import parse_bulk_lines, resolve_bulk_lines
+from job_store import CATALOG_DB
+
+
+@pytest.fixture
+def catalog_db(job_db):
+    conn = sqlite3.connect(CATALOG_DB)
+    conn.execute('CREATE TABLE BR_Bauhandel ("ArtikelNr" TEXT, "AFNr" TEXT, "AF Bezeichnung" TEXT, '
+                 '"Beschreibung" TEXT, "Preis" REAL)')
+    conn.executemany('INSERT INTO BR_Bauhandel VALUES (?, ?, ?, ?, ?)',
+                     [('100001', '00', 'verchromt', 'Kugelhahn 1/2"', 12.5),
+                      ('100002', '00', 'weiss', 'Spülkasten', 89.0),
+                      ('100002', '01', 'schwarz', 'Spülkasten', 94.0)])
+    conn.commit()
+    conn.close()
+    catalog._catalog_index.clear()
+    yield
+    catalog._catalog_index.clear()
+
+
+def test_resolve_bulk_lines(catalog_db):
+    lines = resolve_bulk_lines(parse_bulk_lines("100001;3\n100002;2\n100002;01;1,5\n999999\n100001;x\n\n100002;02;1"))
+    assert [(line['line'], line['status']) for line in lines] == [
+        (1, 'ok'), (2, 'ambiguous'), (3, 'ok'), (4, 'unknown'), (5, 'invalid'), (7, 'unknown')]
+
+    assert lines[0]['item'] == ('100001', 12.5, 'Kugelhahn 1/2"', '00', 'verchromt')
+    assert lines[0]['quantity'] == 3.0
+    assert lines[1]['item'] is None
+    assert lines[1]['error'] == "AFNr needed: 00, 01"
+    assert lines[2]['item'] == ('100002', 94.0, 'Spülkasten', '01', 'schwarz')
+    assert lines[2]['quantity'] == 1.5
+    assert lines[3]['quantity'] == 1.0
+    assert lines[4]['error'] == "invalid quantity 'x'"
+
+
+def test_resolve_bulk_lines_without_catalog(job_db):
+    catalog._catalog_index.clear()
+    assert [line['status'] for line in resolve_bulk_lines(parse_bulk_lines("100001;3"))] == ['unknown']
@@ -0,0 +1,45 @@
+import io
+import os
+from pypdf import PdfReader
+from reportlab.lib.pagesizes import A4, letter
+from reportlab.platypus import Paragraph, SimpleDocTemplate
+from invoicing import STYLES, merge_pdfs, render_invoice, write_batch
+
+
+def make_job(job_id, items=3):
+    return {'job_id': job_id, 'job_date': '2024-03-01', 'client_name': 'Client', 'client_address': 'Street 1',
+            'total_amount': 10.0 * items,
+            'items': [{'description': f'Item {i}', 'quantity': 1, 'price': 10.0} for i in range(items)]}
+
+
+def letter_pdf():
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, pagesize=letter).build([Paragraph('Letter', STYLES['Normal'])])
+    return buffer.getvalue()
+
+
+def test_merge_pdfs_keeps_pages_and_media_boxes():
+    pdfs = [render_invoice(make_job('T1')), render_invoice(make_job('T2', items=80)), letter_pdf()]
+    pages = [len(PdfReader(io.BytesIO(pdf)).pages) for pdf in pdfs]
+    assert pages[1] > 1
+
+    out = io.BytesIO()
+    merge_pdfs(iter(pdfs), out)
+    merged = PdfReader(io.BytesIO(out.getvalue()), strict=True)
+
+    assert len(merged.pages) == sum(pages)
+    boxes = [(round(float(page.mediabox.width)), round(float(page.mediabox.height))) for page in merged.pages]
+    a4, us = (round(A4[0]), round(A4[1])), (round(letter[0]), round(letter[1]))
+    assert boxes == [a4] * (pages[0] + pages[1]) + [us]
+    assert 'Invoice #: T2' in merged.pages[pages[0]].extract_text()
+
+
+def test_write_batch_merges_every_invoice():
+    jobs = [make_job(f'T{i}') for i in range(5)]
+    path = write_batch((job, render_invoice(job)) for job in jobs)
+    try:
+        reader = PdfReader(path, strict=True)
+        assert len(reader.pages) == 5
+        assert [f'Invoice #: T{i}' in page.extract_text() for i, page in enumerate(reader.pages)] == [True] * 5
+    finally:
+        os.remove(path)
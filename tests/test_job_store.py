@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+from archive import archive_jobs
+from conftest import save
+from database import page_cursor
+from job_store import archives_for, attach_archives, connect, delete_jobs, select_jobs
+
+
+def pages(filters, order, limit):
+    # every page of select_jobs the way the job list pages through them
+    pages, after = [], None
+    with connect() as conn:
+        schemas = attach_archives(conn, archives_for(*filters[:2]))
+        while True:
+            query, params = select_jobs(schemas, filters, order, after, limit)
+            jobs = pd.read_sql_query(query, conn, params=params)
+            if jobs.empty:
+                return pages
+            pages.append(list(jobs['job_id']))
+            after = page_cursor(jobs)
+
+
+@pytest.fixture
+def jobs(job_db):
+    # 3 jobs a day, the first days old enough for the 2020 archive
+    days = ['2020-03-01', '2020-03-01', '2020-06-15', '2026-01-05', '2026-01-05', '2026-02-10', '2026-02-11']
+    job_ids = [save(f"J{n:03d}", day, items=[('work', 'Kupferrohr verlegen', 40.0, 1)])
+               for n, day in enumerate(day for day in days for _ in range(3))]
+    assert archive_jobs() == {2020: 9}
+    return job_ids
+
+
+@pytest.mark.parametrize('limit', [1, 4, 7, 50])
+def test_pages_newest_first(jobs, limit):
+    result = pages((None, None, None), 'newest', limit)
+    assert all(len(page) == limit for page in result[:-1])
+    assert [job_id for page in result for job_id in page] == jobs[::-1]
+
+
+def test_pages_oldest_first_within_dates(jobs):
+    result = pages(('2020-03-01', '2026-01-05', None), 'oldest', 4)
+    assert [job_id for page in result for job_id in page] == jobs[:15]
+
+
+def test_pages_by_search_rank(jobs):
+    # equal ranks go by job_id, so no job is repeated or left out
+    result = pages((None, None, 'Kupferrohr'), 'rank', 5)
+    assert sorted(job_id for page in result for job_id in page) == jobs
+    assert len({job_id for page in result for job_id in page}) == len(jobs)
+
+
+def test_pages_skip_deleted_jobs(jobs):
+    delete_jobs(['J004', 'J010'])
+    result = pages((None, None, None), 'newest', 3)
+    assert [job_id for page in result for job_id in page] == [j for j in jobs[::-1] if j not in ('J004', 'J010')]
@@ -0,0 +1,49 @@
+import sqlite3
+from migrations import MIGRATIONS, migrate, schema_version
+
+# the tables as the app created them before there were migrations
+PRE_SERIES = '''
+CREATE TABLE jobs
+    (id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT, client_name TEXT, client_address TEXT,
+    job_date TEXT, job_notes TEXT, total_amount REAL, timestamp TEXT);
+CREATE TABLE job_items
+    (id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT, type TEXT, description TEXT, price REAL, quantity REAL);
+'''
+
+
+def tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index', 'trigger')")}
+
+
+def test_migrate_fresh_database(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'job_data.db')
+    assert migrate(conn) == len(MIGRATIONS)
+    assert schema_version(conn) == len(MIGRATIONS)
+    assert {'jobs', 'job_items', 'id_counters', 'summary_revenue', 'job_search', 'jobs_fts',
+            'idx_jobs_date_job_id', 'summary_jobs_mark_deleted'} <= tables(conn)
+    assert migrate(conn) == 0
+
+
+def test_migrate_pre_series_database(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'job_data.db')
+    conn.executescript(PRE_SERIES)
+    # two jobs saved in the same second share a job_id, one item lost its
+    # job, a job and an item have no job_id at all
+    conn.executemany("INSERT INTO jobs (job_id, client_name, client_address, job_date, job_notes, total_amount, timestamp) "
+                     "VALUES (?, ?, 'Street 1', ?, '', ?, '')",
+                     [('20230101_100000', 'Meier', '2023-01-01', 50.0), ('20230101_100000', 'Huber', '2023-01-01', 20.0),
+                      ('20230102_090000', 'Meier', '2023-01-02', 30.0), (None, 'Huber', '2023-01-03', 0.0)])
+    conn.executemany("INSERT INTO job_items (job_id, type, description, price, quantity) VALUES (?, ?, ?, ?, ?)",
+                     [('20230101_100000', 'work', 'Pipe fitting', 25.0, 2), ('20230102_090000', 'material', 'Kugelhahn', 30.0, 1),
+                      ('gone', 'work', 'Orphan', 10.0, 1), (None, 'work', 'No job', 10.0, 1)])
+    conn.commit()
+
+    assert migrate(conn) == len(MIGRATIONS)
+    assert schema_version(conn) == len(MIGRATIONS)
+    assert conn.execute("SELECT job_id FROM jobs ORDER BY id").fetchall() == [
+        ('20230101_100000',), ('20230101_100000_2',), ('20230102_090000',), (None,)]
+    assert conn.execute("SELECT description FROM job_items ORDER BY id").fetchall() == [('Pipe fitting',), ('Kugelhahn',)]
+    assert conn.execute("SELECT status, deleted_at FROM jobs").fetchall() == [('open', None)] * 4
+    assert conn.execute("SELECT client_name, jobs, total FROM summary_revenue WHERE day = '2023-01-01' "
+                        "ORDER BY client_name").fetchall() == [('Huber', 1, 20.0), ('Meier', 1, 50.0)]
+    assert conn.execute("SELECT job_id FROM jobs_fts WHERE jobs_fts MATCH 'Kugelhahn'").fetchall() == [('20230102_090000',)]
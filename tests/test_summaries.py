@@ -0,0 +1,36 @@
+from conftest import save
+from job_store import connect, delete_jobs, purge_deleted_jobs, restore_deleted_jobs, set_job_status, update_jobs, write
+from summaries import rebuild_summaries
+
+SUMMARY_TABLES = ('summary_revenue', 'summary_item_types', 'summary_articles')
+
+
+def summary_rows(conn):
+    return {table: sorted(conn.execute(f"SELECT * FROM {table}").fetchall()) for table in SUMMARY_TABLES}
+
+
+def test_triggers_match_rebuild(job_db):
+    catalog = ('catalog', 'Kugelhahn 1/2"', 12.5, 2, '100001')
+    for n in range(12):
+        save(f"J{n:03d}", f"2026-0{n % 3 + 1}-1{n % 4}", client=f"Client {n % 5}",
+             items=[('work', 'Montage', 80.0, n % 3 + 1), catalog, ('material', 'Rohr', 4.25, 8)])
+    save('J100', '2026-03-01', items=[catalog])
+
+    set_job_status(['J001', 'J002', 'J003'], 'invoiced')
+    update_jobs(['J004', 'J005'], job_date='2026-05-01', status='paid')
+    delete_jobs(['J006', 'J007', 'J100'])
+    restore_deleted_jobs(['J007'])
+    write(lambda conn: conn.execute("UPDATE jobs SET deleted_at = '2000-01-01 00:00:00' WHERE job_id = 'J006'"))
+    write(purge_deleted_jobs)
+    write(lambda conn: conn.execute("DELETE FROM job_items WHERE job_id = 'J008' AND type = 'catalog'"))
+
+    with connect() as conn:
+        maintained = summary_rows(conn)
+        conn.execute("BEGIN")
+        rebuild_summaries(conn)
+        rebuilt = summary_rows(conn)
+        conn.rollback()
+
+    assert maintained == rebuilt
+    assert ('100001', 'Kugelhahn 1/2"', 10, 20.0, 250.0) in rebuilt['summary_articles']
+    assert sum(row[3] for row in rebuilt['summary_revenue'] if row[2] == 'paid') == 2